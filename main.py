@@ -6,6 +6,9 @@ from modules.ui.register import RegisterScreen
 from modules.ui.recognize import RecognizeScreen
 from modules.ui.gallery import GalleryScreen
 from modules.ui.export import ExportScreen
+from modules.utils.metrics import metrics
+from modules.database.events import event_log
+from modules.face_recognition.scheduler import training_scheduler
 import os
 
 class RootScreenManager(ScreenManager):
@@ -37,7 +40,15 @@ class FaceApp(App):
                 Clock.schedule_once(lambda dt: load_screens(index + 1), 0.1)
         
         load_screens(0)
+        # Resumen JSON periódico de las métricas por etapa (solo con METRICS_DUMP)
+        metrics.start_dump()
         return sm
 
+    def on_stop(self):
+        # Un entrenamiento a medias se descarta sin publicar su generación
+        training_scheduler.cancel()
+        # Escribir los reconocimientos que quedan en la cola antes de salir
+        event_log.stop()
+
 if __name__ == '__main__':
     FaceApp().run()
\ No newline at end of file
@@ -1,114 +1,358 @@
-import cv2
-import platform
+import os
+import threading
+import time
+from collections import deque
+import numpy as np
 from kivy.graphics.texture import Texture
 from kivy.clock import Clock
 from kivy.logger import Logger
 from threading import Lock
+from modules.camera.sources import create_source, WebcamSource
+from modules.utils.metrics import metrics
 
-class CameraManager:
-    _instance = None
-    _lock = Lock()
-    
-    def __new__(cls):
-        if cls._instance is None:
-            with cls._lock:
-                if cls._instance is None:
-                    cls._instance = super().__new__(cls)
-                    cls._instance._initialize()
-        return cls._instance
-    
-    def _initialize(self):
+# Frames recientes que se conservan; los más viejos se descartan ("gana el último")
+RING_SIZE = 2
+
+# Fuente por defecto: CAMERA_SOURCE=video.mp4 o una carpeta reproduce en lugar de la
+# webcam; CAMERA_REPLAY=max la reproduce a máxima velocidad sin perder frames
+CAMERA_SOURCE = os.environ.get("CAMERA_SOURCE")
+CAMERA_REPLAY = os.environ.get("CAMERA_REPLAY", "realtime")
+
+# Nombre de la cámara que usan las pantallas de la app
+DEFAULT_CAMERA = "principal"
+
+class CameraStream:
+    """
+    Una cámara con nombre: su fuente, su hilo de captura y su buffer circular
+
+    Las pantallas que la comparten llevan la cuenta en active_screens; el
+    dispositivo se libera cuando la última la suelta.
+    """
+
+    def __init__(self, name):
+        self.name = name
         self.cap = None
         self.active_screens = 0
-        self._texture = None
+        self._lock = Lock()
         self._is_releasing = False
+        
+        # Hilo productor y buffer circular de frames
+        self._frame_lock = Lock()
+        self._buffer = deque(maxlen=RING_SIZE)
+        self._capture_thread = None
+        self._stop_event = threading.Event()
+        self._seq = 0
+        self._last_read_seq = 0
+        self.dropped_frames = 0
+        # Fuentes sin ritmo real: el productor espera a que se consuma cada frame
+        self._consumed = threading.Event()
 
-    def open_camera(self, start_index=0, max_index=5):
+    def open(self, source):
+        """Abre la fuente o suma un usuario si ya estaba abierta"""
         with self._lock:
             if self._is_releasing:
-                Logger.info("Cámara en proceso de liberación, esperando...")
+                Logger.info(f"Cámara {self.name} en proceso de liberación, esperando...")
                 return False
                 
-            if self.cap is not None and self.cap.isOpened():
+            if self.cap is not None:
                 self.active_screens += 1
-                Logger.info(f"Cámara ya abierta (usuarios activos: {self.active_screens})")
+                Logger.info(f"Cámara {self.name} ya abierta (usuarios activos: {self.active_screens})")
                 return True
-                
-            system = platform.system()
-            backend = cv2.CAP_DSHOW if system == "Windows" else cv2.CAP_ANY
             
-            for i in range(start_index, max_index + 1):
+            if not source.open():
+                return False
+            self.cap = source
+            self.active_screens = 1
+            self._start_capture_thread(source)
+            return True
+    
+    def _start_capture_thread(self, cap):
+        """Inicia el hilo que lee frames continuamente hacia el buffer"""
+        self._stop_event = threading.Event()
+        # Por hilo: si release() no logra esperarlo, el productor libera la fuente al salir
+        self._producer_exited = threading.Event()
+        self._release_on_exit = threading.Event()
+        with self._frame_lock:
+            self._buffer.clear()
+            self._last_read_seq = self._seq
+        self._capture_thread = threading.Thread(
+            target=self._capture_loop,
+            args=(cap, self._stop_event, self._producer_exited, self._release_on_exit),
+            daemon=True)
+        self._capture_thread.start()
+
+    def _capture_loop(self, cap, stop_event, exited, release_on_exit):
+        """Productor: cap.read() bloqueante fuera del lock y del hilo de la UI"""
+        try:
+            self._produce(cap, stop_event)
+        finally:
+            # release() decide bajo el mismo lock quién libera la fuente
+            with self._frame_lock:
+                exited.set()
+                owns_cap = release_on_exit.is_set()
+            if owns_cap:
                 try:
-                    cap = cv2.VideoCapture(i, backend)
-                    if cap.isOpened():
-                        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-                        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-                        cap.set(cv2.CAP_PROP_FPS, 30)
-                        self.cap = cap
-                        self.active_screens = 1
-                        Logger.info(f"✅ Cámara abierta en índice {i}")
-                        return True
-                    else:
-                        cap.release()
+                    cap.release()
+                    Logger.info(f"🔴 Cámara {self.name} liberada por su hilo de captura")
                 except Exception as e:
-                    Logger.error(f"Error al abrir cámara en índice {i}: {str(e)}")
-                    if 'cap' in locals():
-                        cap.release()
+                    Logger.error(f"Error al liberar cámara {self.name}: {str(e)}")
+
+    def _produce(self, cap, stop_event):
+        self._consumed.set()
+        while not stop_event.is_set():
+            if not cap.realtime:
+                # Reproducción a máxima velocidad: no pisar un frame que nadie leyó
+                if not self._consumed.wait(0.1):
+                    continue
+            try:
+                with metrics.stage("captura"):
+                    ret, frame = cap.read()
+            except Exception as e:
+                Logger.error(f"Error al leer frame de {self.name}: {str(e)}")
+                ret, frame = False, None
             
-            Logger.error("❌ No se pudo abrir ninguna cámara disponible.")
-            return False
-    
-    def release_camera(self):
+            if stop_event.is_set():
+                # La cámara se liberó mientras cap.read() bloqueaba
+                break
+            if not ret:
+                if cap.finished:
+                    # Fin de la reproducción: el último frame queda en el buffer
+                    break
+                time.sleep(0.01)
+                continue
+            
+            # El efecto espejo se aplica al mostrar (FrameDisplay), sin copiar píxeles
+            # Compartido entre consumidores: solo lectura
+            frame.flags.writeable = False
+            
+            with self._frame_lock:
+                self._seq += 1
+                self._buffer.append((frame, self._seq, time.monotonic()))
+                self._consumed.clear()
+            metrics.tick("captura")
+
+    def release(self):
+        """Resta un usuario y libera el dispositivo cuando no queda ninguno"""
         with self._lock:
             if self.active_screens > 0:
                 self.active_screens -= 1
-                Logger.info(f"Cámara: Usuarios activos restantes: {self.active_screens}")
+                Logger.info(f"Cámara {self.name}: Usuarios activos restantes: {self.active_screens}")
                 
             if self.active_screens == 0 and self.cap is not None:
                 self._is_releasing = True
                 try:
-                    self.cap.release()
+                    # Detener el productor antes de liberar el dispositivo
+                    self._stop_event.set()
+                    thread, self._capture_thread = self._capture_thread, None
+                    if thread is not None:
+                        thread.join(timeout=1.0)
+                    with self._frame_lock:
+                        # Un productor bloqueado en cap.read() todavía usa la fuente
+                        handoff = thread is not None and not self._producer_exited.is_set()
+                        if handoff:
+                            self._release_on_exit.set()
+                        self._buffer.clear()
+                    if handoff:
+                        Logger.warning(f"Cámara {self.name}: el hilo de captura sigue en cap.read(); "
+                                       f"liberará la fuente al terminar")
+                    else:
+                        self.cap.release()
+                        Logger.info(f"🔴 Cámara {self.name} liberada correctamente")
                     self.cap = None
-                    Logger.info("🔴 Cámara liberada correctamente")
                 except Exception as e:
-                    Logger.error(f"Error al liberar cámara: {str(e)}")
+                    Logger.error(f"Error al liberar cámara {self.name}: {str(e)}")
                 finally:
                     self._is_releasing = False
     
-    def read_frame(self):
-        with self._lock:
-            if self._is_releasing or self.cap is None or not self.cap.isOpened():
+    def read_latest(self, after_seq=None):
+        """
+        Devuelve el frame más reciente sin bloquear
+        
+        Args:
+            after_seq: Si se indica, devuelve None salvo que haya un frame más nuevo
+        
+        Returns:
+            tuple: (frame de solo lectura, número de secuencia, timestamp monotonic)
+                   o None si no hay frame disponible
+        """
+        # Etapa "lectura": espera del lock y entrega, solo cuando hay un frame que devolver
+        start = time.perf_counter()
+        with self._frame_lock:
+            if not self._buffer:
                 return None
-                
-            try:
-                ret, frame = self.cap.read()
-                if ret:
-                    # CORREGI EL EFECTO ESPEJO AQUÍ
-                    frame = cv2.flip(frame, 1)  # Volteo horizontal
-                return frame if ret else None
-            except Exception as e:
-                Logger.error(f"Error al leer frame: {str(e)}")
+            frame, seq, timestamp = self._buffer[-1]
+            if after_seq is not None and seq <= after_seq:
                 return None
+            # Frames que nadie llegó a consumir
+            if seq > self._last_read_seq:
+                self.dropped_frames += max(0, seq - self._last_read_seq - 1)
+                self._last_read_seq = seq
+                self._consumed.set()
+        metrics.record("lectura", 1000.0 * (time.perf_counter() - start))
+        return frame, seq, timestamp
+
+    @property
+    def is_open(self):
+        return self.cap is not None and not self._is_releasing
+
+    @property
+    def source_finished(self):
+        """True si la fuente abierta es una reproducción que ya terminó"""
+        cap = self.cap
+        return cap is not None and cap.finished
+
+class CameraManager:
+    """
+    Registro de cámaras con nombre, cada una con su propio hilo de captura
+
+    Sin nombre, los métodos operan sobre DEFAULT_CAMERA, la que usan las pantallas.
+    """
+    _instance = None
+    _lock = Lock()
+    
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+                    cls._instance._initialize()
+        return cls._instance
+    
+    def _initialize(self):
+        self.streams = {}
+        self.source = None
+        if CAMERA_SOURCE:
+            self.source = create_source(CAMERA_SOURCE, realtime=CAMERA_REPLAY != "max")
+        self._texture = None
+
+    def set_source(self, source):
+        """
+        Cambia el origen de frames (FrameSource) de la cámara principal para la
+        próxima apertura
+
+        None vuelve a la webcam. No afecta a una fuente ya abierta.
+        """
+        with self._lock:
+            self.source = source
+
+    def stream(self, name=DEFAULT_CAMERA):
+        """CameraStream registrada con ese nombre (se crea cerrada si no existe)"""
+        with self._lock:
+            stream = self.streams.get(name)
+            if stream is None:
+                stream = self.streams[name] = CameraStream(name)
+            return stream
+
+    def open_camera(self, start_index=0, max_index=5, name=DEFAULT_CAMERA, source=None):
+        """
+        Abre una cámara con nombre
+
+        Args:
+            name: Nombre de la cámara
+            source: FrameSource a usar; por defecto la configurada con set_source
+                    (solo la principal) o la primera webcam entre los índices dados
+        """
+        if source is None:
+            source = self.source if name == DEFAULT_CAMERA else None
+        return self.stream(name).open(source or WebcamSource(start_index, max_index))
+
+    def release_camera(self, name=DEFAULT_CAMERA):
+        stream = self.streams.get(name)
+        if stream is not None:
+            stream.release()
+
+    def read_latest(self, after_seq=None, name=DEFAULT_CAMERA):
+        """Frame más reciente de una cámara; ver CameraStream.read_latest"""
+        stream = self.streams.get(name)
+        return stream.read_latest(after_seq) if stream is not None else None
+
+    @property
+    def active_screens(self):
+        stream = self.streams.get(DEFAULT_CAMERA)
+        return stream.active_screens if stream is not None else 0
+
+    @property
+    def dropped_frames(self):
+        stream = self.streams.get(DEFAULT_CAMERA)
+        return stream.dropped_frames if stream is not None else 0
+
+    @property
+    def source_finished(self):
+        stream = self.streams.get(DEFAULT_CAMERA)
+        return stream is not None and stream.source_finished
+
+    def read_frame(self, name=DEFAULT_CAMERA):
+        """Último frame disponible como copia modificable (para dibujar encima)"""
+        stream = self.streams.get(name)
+        if stream is None or not stream.is_open:
+            return None
+        latest = stream.read_latest()
+        return latest[0].copy() if latest is not None else None
     
     def frame_to_texture(self, frame):
+        """Crea una textura nueva por llamada; para video usar FrameDisplay"""
         if frame is None:
             return None
             
         try:
-            # Voltear verticalmente para corregir orientación en Kivy
-            frame = cv2.flip(frame, 0)  # 0 = volteo vertical
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            buf = frame_rgb.tobytes()
-            
-            texture = Texture.create(
-                size=(frame.shape[1], frame.shape[0]), 
-                colorfmt='rgb'
-            )
-            texture.blit_buffer(buf, colorfmt='rgb', bufferfmt='ubyte')
-            return texture
+            return FrameDisplay().update(frame)
         except Exception as e:
             Logger.error(f"Error al convertir frame a textura: {str(e)}")
             return None
 
+class FrameDisplay:
+    """
+    Textura reutilizable para mostrar frames BGR de OpenCV
+    
+    Se crea una sola vez por resolución; la orientación vertical y el espejo se
+    resuelven con coordenadas de textura. blit_buffer de Kivy solo acepta
+    buffers modificables: un frame de solo lectura del buffer de la cámara se
+    copia a un arreglo reutilizado en lugar de crear bytes nuevos en cada frame.
+    """
+    
+    def __init__(self, mirror=False):
+        self.mirror = mirror
+        self.texture = None
+        self._size = None
+        self._staging = None
+    
+    def _buffer(self, frame):
+        """Buffer BGR contiguo y modificable para blit_buffer"""
+        if frame.flags.c_contiguous and frame.flags.writeable:
+            return frame.reshape(-1)
+        if self._staging is None or self._staging.shape != frame.shape:
+            self._staging = np.empty(frame.shape, dtype=np.uint8)
+        np.copyto(self._staging, frame)
+        return self._staging.reshape(-1)
+    
+    def update(self, frame):
+        """Sube el frame a la textura (creándola si cambió la resolución)"""
+        height, width = frame.shape[:2]
+        if self.texture is None or self._size != (width, height):
+            self.texture = Texture.create(size=(width, height), colorfmt='bgr')
+            # Las filas de OpenCV van de arriba hacia abajo
+            self.texture.flip_vertical()
+            if self.mirror:
+                self.texture.flip_horizontal()
+            self._size = (width, height)
+        with metrics.stage("textura"):
+            self.texture.blit_buffer(self._buffer(frame), colorfmt='bgr', bufferfmt='ubyte')
+        return self.texture
+    
+    def show(self, image_widget, frame):
+        """Muestra el frame en un widget Image reutilizando la textura"""
+        if frame is None:
+            return
+        try:
+            texture = self.update(frame)
+            if image_widget.texture is not texture:
+                image_widget.texture = texture
+            else:
+                # Misma textura con contenido nuevo: solo pedir redibujado
+                image_widget.canvas.ask_update()
+        except Exception as e:
+            Logger.error(f"Error al mostrar frame: {str(e)}")
+
 # Instancia global del administrador de cámara
-camera_manager = CameraManager()
\ No newline at end of file
+camera_manager = CameraManager()
+metrics.register_gauge("frames_perdidos", lambda: camera_manager.dropped_frames)
\ No newline at end of file
@@ -0,0 +1,221 @@
+import os
+import cv2
+import platform
+import time
+from kivy.logger import Logger
+
+# Ritmo de reproducción de una carpeta de imágenes y de videos sin FPS en la cabecera
+REPLAY_FPS = 30.0
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+class FrameSource:
+    """
+    Origen de frames para CameraManager
+
+    read() bloquea hasta el próximo frame y devuelve (ok, frame) como
+    cv2.VideoCapture. Las fuentes de reproducción con realtime=False entregan
+    los frames a máxima velocidad y CameraManager espera a que se consuma cada
+    uno, así la misma grabación produce siempre la misma secuencia.
+    """
+    name = "fuente"
+    realtime = True
+
+    def open(self):
+        """Abre el origen; devuelve True si quedó listo para leer"""
+        raise NotImplementedError
+
+    def read(self):
+        raise NotImplementedError
+
+    def release(self):
+        pass
+
+    @property
+    def finished(self):
+        """True si una reproducción llegó al final y no se repite"""
+        return False
+
+class WebcamSource(FrameSource):
+    """Primera cámara disponible entre los índices start_index y max_index"""
+
+    def __init__(self, start_index=0, max_index=5, width=640, height=480, fps=30):
+        self.start_index = start_index
+        self.max_index = max_index
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.cap = None
+        self.name = "cámara"
+
+    def open(self):
+        system = platform.system()
+        backend = cv2.CAP_DSHOW if system == "Windows" else cv2.CAP_ANY
+
+        for i in range(self.start_index, self.max_index + 1):
+            cap = None
+            try:
+                cap = cv2.VideoCapture(i, backend)
+                if cap.isOpened():
+                    cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+                    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+                    cap.set(cv2.CAP_PROP_FPS, self.fps)
+                    # Evitar que el driver acumule frames viejos
+                    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+                    self.cap = cap
+                    self.name = f"cámara {i}"
+                    Logger.info(f"✅ Cámara abierta en índice {i}")
+                    return True
+                cap.release()
+            except Exception as e:
+                Logger.error(f"Error al abrir cámara en índice {i}: {str(e)}")
+                if cap is not None:
+                    cap.release()
+
+        Logger.error("❌ No se pudo abrir ninguna cámara disponible.")
+        return False
+
+    def read(self):
+        return self.cap.read()
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+class _ReplaySource(FrameSource):
+    """Reproducción a ritmo real (realtime=True) o a máxima velocidad"""
+
+    def __init__(self, path, realtime=True, loop=False):
+        self.path = path
+        self.realtime = realtime
+        self.loop = loop
+        self.name = os.path.basename(os.path.normpath(path))
+        self.fps = REPLAY_FPS
+        self._start = None
+        self._count = 0
+        self._finished = False
+
+    @property
+    def finished(self):
+        return self._finished
+
+    def _restart_clock(self):
+        self._start = time.monotonic()
+        self._count = 0
+        self._finished = False
+
+    def _wait_turn(self):
+        """Con realtime, espera al instante en que el frame saldría de la cámara"""
+        if self.realtime:
+            delay = self._start + self._count / self.fps - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        self._count += 1
+
+    def _read_next(self):
+        """Próximo frame del origen, o None al llegar al final"""
+        raise NotImplementedError
+
+    def _rewind(self):
+        raise NotImplementedError
+
+    def read(self):
+        if self._finished:
+            return False, None
+        frame = self._read_next()
+        if frame is None and self.loop:
+            self._rewind()
+            self._restart_clock()
+            frame = self._read_next()
+        if frame is None:
+            self._finished = True
+            Logger.info(f"Reproducción terminada: {self.name}")
+            return False, None
+        self._wait_turn()
+        return True, frame
+
+class VideoFileSource(_ReplaySource):
+    """Reproduce un archivo de video"""
+
+    def __init__(self, path, realtime=True, loop=False):
+        super().__init__(path, realtime, loop)
+        self.cap = None
+
+    def open(self):
+        cap = cv2.VideoCapture(self.path)
+        if not cap.isOpened():
+            Logger.error(f"❌ No se pudo abrir el video: {self.path}")
+            cap.release()
+            return False
+        self.cap = cap
+        self.fps = cap.get(cv2.CAP_PROP_FPS) or REPLAY_FPS
+        self._restart_clock()
+        Logger.info(f"✅ Video abierto: {self.path} ({self.fps:.1f} fps)")
+        return True
+
+    def _read_next(self):
+        ret, frame = self.cap.read()
+        return frame if ret else None
+
+    def _rewind(self):
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+class ImageDirectorySource(_ReplaySource):
+    """Reproduce las imágenes de una carpeta en orden alfabético a fps cuadros por segundo"""
+
+    def __init__(self, path, realtime=True, loop=False, fps=REPLAY_FPS):
+        super().__init__(path, realtime, loop)
+        self.fps = fps
+        self._files = []
+        self._index = 0
+
+    def open(self):
+        if not os.path.isdir(self.path):
+            Logger.error(f"❌ No existe la carpeta: {self.path}")
+            return False
+        self._files = [os.path.join(self.path, f) for f in sorted(os.listdir(self.path))
+                       if f.lower().endswith(IMAGE_EXTENSIONS)]
+        if not self._files:
+            Logger.error(f"❌ La carpeta no tiene imágenes: {self.path}")
+            return False
+        self._index = 0
+        self._restart_clock()
+        Logger.info(f"✅ Carpeta abierta: {self.path} ({len(self._files)} imágenes)")
+        return True
+
+    def _read_next(self):
+        while self._index < len(self._files):
+            frame = cv2.imread(self._files[self._index])
+            self._index += 1
+            if frame is not None:
+                return frame
+            Logger.warning(f"Imagen ilegible omitida: {self._files[self._index - 1]}")
+        return None
+
+    def _rewind(self):
+        self._index = 0
+
+def create_source(spec=None, realtime=True, loop=False):
+    """
+    Crea una fuente a partir de una especificación
+
+    Args:
+        spec: None o índice de cámara ("0") para la webcam, una carpeta de
+              imágenes o un archivo de video
+        realtime: Reproducir al ritmo original o a máxima velocidad
+        loop: Repetir la reproducción al llegar al final
+
+    Returns:
+        FrameSource
+    """
+    if spec is None or str(spec).isdigit():
+        index = int(spec) if spec is not None else 0
+        return WebcamSource(index, index if spec is not None else 5)
+    if os.path.isdir(spec):
+        return ImageDirectorySource(spec, realtime, loop)
+    return VideoFileSource(spec, realtime, loop)
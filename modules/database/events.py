@@ -0,0 +1,226 @@
+import os
+# Kivy no debe interpretar los argumentos de esta herramienta
+os.environ.setdefault("KIVY_NO_ARGS", "1")
+
+import time
+import queue
+import sqlite3
+import argparse
+import threading
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from kivy.logger import Logger
+
+# Un archivo SQLite por día (eventos/AAAA-MM-DD.db): las consultas de días
+# recientes solo abren esos archivos y borrar un día es borrar su archivo
+EVENTS_DIR = "eventos"
+# El escritor guarda un lote cada EVENT_BATCH_SIZE eventos o, como máximo,
+# EVENT_FLUSH_INTERVAL segundos después del primer evento del lote
+EVENT_BATCH_SIZE = 50
+EVENT_FLUSH_INTERVAL = 0.5
+# Cola acotada: si el disco no da abasto se descartan eventos, nunca se espera
+EVENT_QUEUE_SIZE = 10000
+
+RecognitionEvent = namedtuple("RecognitionEvent",
+                              ["timestamp", "camera", "user_name", "confidence", "track_id"])
+
+# Marcador para detener el hilo escritor (flush() encola un threading.Event)
+_STOP = object()
+
+def partition_path(day):
+    return os.path.join(EVENTS_DIR, f"{day.isoformat()}.db")
+
+def _open_partition(day):
+    os.makedirs(EVENTS_DIR, exist_ok=True)
+    conn = sqlite3.connect(partition_path(day))
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    with conn:
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp REAL NOT NULL,
+            camera TEXT,
+            user_name TEXT NOT NULL,
+            confidence REAL,
+            track_id INTEGER
+        )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_events_user ON events(user_name, timestamp)")
+    return conn
+
+class EventLog:
+    """
+    Registro de reconocimientos (quién y cuándo) que solo agrega eventos
+
+    log() encola en memoria y retorna de inmediato; un hilo escritor agrupa
+    los eventos y los inserta por lotes en la partición de su día.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+                    cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        self._queue = queue.Queue(maxsize=EVENT_QUEUE_SIZE)
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+
+    def log(self, user_name, confidence=None, camera=None, track_id=None, timestamp=None):
+        """Encola un reconocimiento sin bloquear; si la cola está llena se descarta"""
+        event = RecognitionEvent(timestamp or time.time(), camera, user_name, confidence, track_id)
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+        if self._thread is None:
+            self._start_writer()
+
+    def _start_writer(self):
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._writer, daemon=True)
+                self._thread.start()
+
+    def flush(self, timeout=5.0):
+        """Espera a que se escriban los eventos encolados hasta ahora"""
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def stop(self, timeout=5.0):
+        """Escribe lo pendiente y detiene el hilo escritor (al cerrar la app)"""
+        with self._thread_lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def _writer(self):
+        connections = {}
+        batch = []
+        deadline = None
+        try:
+            while True:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+
+                if isinstance(item, RecognitionEvent):
+                    batch.append(item)
+                    if deadline is None:
+                        deadline = time.monotonic() + EVENT_FLUSH_INTERVAL
+                    if len(batch) < EVENT_BATCH_SIZE:
+                        continue
+
+                # Lote lleno, plazo vencido, flush() o stop()
+                if batch:
+                    self._write_batch(connections, batch)
+                    batch = []
+                deadline = None
+                if isinstance(item, threading.Event):
+                    item.set()
+                elif item is _STOP:
+                    break
+        finally:
+            for conn in connections.values():
+                conn.close()
+
+    def _write_batch(self, connections, batch):
+        """Una transacción por partición del lote"""
+        by_day = {}
+        for event in batch:
+            by_day.setdefault(date.fromtimestamp(event.timestamp), []).append(event)
+        for day, events in by_day.items():
+            try:
+                conn = connections.get(day)
+                if conn is None:
+                    # Solo quedan abiertas las particiones en uso
+                    for old_day in [d for d in connections if d < day]:
+                        connections.pop(old_day).close()
+                    conn = connections[day] = _open_partition(day)
+                with conn:
+                    conn.executemany(
+                        "INSERT INTO events (timestamp, camera, user_name, confidence, track_id) "
+                        "VALUES (?, ?, ?, ?, ?)", events)
+                self.written += len(events)
+            except Exception as e:
+                self.dropped += len(events)
+                Logger.error(f"Eventos: error al escribir {len(events)} eventos del {day}: {str(e)}")
+
+# Instancia global del registro de eventos
+event_log = EventLog()
+
+def log_recognized(confirmed, camera=None):
+    """
+    Registra tal cual los rostros que el tracker ya confirmó
+
+    Args:
+        confirmed: ConfirmedFace de FaceTracker.confirmed()
+        camera: Nombre de la cámara
+    """
+    for face in confirmed:
+        event_log.log(face.user_name, face.confidence, camera, face.track_id)
+
+def query_events(since=None, until=None, user_name=None):
+    """
+    Eventos entre dos instantes, leyendo solo las particiones de esos días
+
+    Args:
+        since: datetime inicial (por defecto, el comienzo del día de hoy)
+        until: datetime final (por defecto, ahora)
+        user_name: Filtrar por usuario
+
+    Returns:
+        list: RecognitionEvent en orden cronológico
+    """
+    until = until or datetime.now()
+    since = since or datetime.combine(until.date(), datetime.min.time())
+    sql = ("SELECT timestamp, camera, user_name, confidence, track_id FROM events "
+           "WHERE timestamp >= ? AND timestamp <= ?")
+    params = [since.timestamp(), until.timestamp()]
+    if user_name:
+        sql += " AND user_name = ?"
+        params.append(user_name)
+
+    events = []
+    day = since.date()
+    while day <= until.date():
+        path = partition_path(day)
+        if os.path.exists(path):
+            conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            try:
+                events.extend(RecognitionEvent(*row) for row in
+                              conn.execute(sql + " ORDER BY timestamp", params))
+            finally:
+                conn.close()
+        day += timedelta(days=1)
+    return events
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lista los reconocimientos registrados")
+    parser.add_argument("--dias", type=int, default=1, help="Días hacia atrás, incluido hoy (default: 1)")
+    parser.add_argument("--usuario", default=None, help="Solo este usuario")
+    args = parser.parse_args(argv)
+
+    today = datetime.combine(date.today(), datetime.min.time())
+    for event in query_events(today - timedelta(days=args.dias - 1), user_name=args.usuario):
+        when = datetime.fromtimestamp(event.timestamp).strftime("%Y-%m-%d %H:%M:%S")
+        confidence = f"{event.confidence:.1f}%" if event.confidence is not None else "-"
+        print(f"{when}  {event.camera or '-':<12} {event.user_name:<20} {confidence}")
+
+if __name__ == "__main__":
+    main()
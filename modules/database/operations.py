@@ -1,96 +1,431 @@
 import sqlite3
 import os
+import time
+import hashlib
+import threading
 from datetime import datetime
+import cv2
+from kivy.logger import Logger
 from modules.utils.file_io import ensure_user_folder
+from modules.utils.photo_store import (
+    PHOTO_STORAGE, pack_path, is_packed, append_to_pack, truncate_pack,
+    scan_pack, read_photo_bytes
+)
 
 DB_FILE = "data/users.db"
 os.makedirs("data", exist_ok=True)
 
+# Sentencias preparadas que cada conexión conserva para reutilizar
+STATEMENT_CACHE_SIZE = 64
+
+PHOTO_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+# Carpeta con una subcarpeta de fotos por usuario, catalogada en la tabla photos
+PHOTOS_DIR = "data"
+# user_version de la base desde el que el catálogo ya importó las fotos existentes
+PHOTO_CATALOG_VERSION = 1
+
+# Una conexión persistente por hilo (sqlite3 no comparte conexiones entre hilos)
+_local = threading.local()
+
 def _get_conn():
-    conn = sqlite3.connect(DB_FILE)
-    conn.execute("PRAGMA foreign_keys = ON")
+    """
+    Conexión SQLite del hilo actual, abierta una sola vez
+
+    WAL permite leer mientras otro hilo escribe y, con synchronous=NORMAL, solo
+    hace fsync en los checkpoints en lugar de en cada commit. Si DB_FILE apunta
+    a otro archivo (otro directorio de trabajo) se abre una conexión nueva.
+    """
+    path = os.path.abspath(DB_FILE)
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.path != path:
+        if conn is not None:
+            conn.close()
+        conn = sqlite3.connect(path, cached_statements=STATEMENT_CACHE_SIZE)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA foreign_keys = ON")
+        _create_schema(conn)
+        _local.conn = conn
+        _local.path = path
     return conn
 
+def close_connection():
+    """Cierra la conexión del hilo actual (se reabre en la próxima operación)"""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+def _create_schema(conn):
+    with conn:
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE,
+            created_at TEXT,
+            photos_count INTEGER DEFAULT 0
+        )
+        """)
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS photos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            path TEXT UNIQUE NOT NULL,
+            captured_at TEXT,
+            size INTEGER,
+            mtime REAL,
+            sha1 TEXT
+        )
+        """)
+        # Tablas photos creadas antes de que el catálogo guardara tamaño, mtime y hash
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(photos)")}
+        for column, kind in (("size", "INTEGER"), ("mtime", "REAL"), ("sha1", "TEXT")):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE photos ADD COLUMN {column} {kind}")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_photos_user ON photos(user_id, id)")
+    # Primera apertura con catálogo: importar las fotos que ya estaban en disco
+    if conn.execute("PRAGMA user_version").fetchone()[0] < PHOTO_CATALOG_VERSION:
+        _reconcile(conn, PHOTOS_DIR)
+
 def init_db():
-    conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT UNIQUE,
-        created_at TEXT,
-        photos_count INTEGER DEFAULT 0
-    )
-    """)
-    conn.commit()
-    conn.close()
+    """Crea las tablas si no existen (también se hace al abrir cada conexión)"""
+    _create_schema(_get_conn())
 
 def add_user(name):
     conn = _get_conn()
-    cur = conn.cursor()
     try:
         # Verificar si el usuario ya existe
-        cur.execute("SELECT id FROM users WHERE name = ?", (name,))
-        exists = cur.fetchone()
-        
+        exists = conn.execute("SELECT id FROM users WHERE name = ?", (name,)).fetchone()
+
         if exists:
             # Usuario existe, no hacer nada
-            conn.close()
             return False
-            
+
         # Insertar nuevo usuario
-        cur.execute(
-            "INSERT INTO users (name, created_at, photos_count) VALUES (?, ?, ?)", 
-            (name, datetime.utcnow().isoformat(), 0)
-        )
-        conn.commit()
+        with conn:
+            conn.execute(
+                "INSERT INTO users (name, created_at, photos_count) VALUES (?, ?, ?)",
+                (name, datetime.utcnow().isoformat(), 0)
+            )
         return True
     except Exception as e:
         Logger.error(f"Error al agregar usuario {name}: {e}")
         return False
-    finally:
-        conn.close()
 
 def update_photo_count(user_name):
     """Actualiza el contador de fotos para un usuario existente"""
     conn = _get_conn()
-    cur = conn.cursor()
     try:
-        cur.execute(
-            "UPDATE users SET photos_count = photos_count + 1 WHERE name = ?",
-            (user_name,)
-        )
-        conn.commit()
+        with conn:
+            conn.execute(
+                "UPDATE users SET photos_count = photos_count + 1 WHERE name = ?",
+                (user_name,)
+            )
     except Exception as e:
         Logger.error(f"Error al actualizar contador de {user_name}: {e}")
-    finally:
-        conn.close()
+
 def list_users():
     conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT id, name, created_at, photos_count FROM users ORDER BY name")
-    rows = cur.fetchall()
-    conn.close()
-    return rows
+    return conn.execute("SELECT id, name, created_at, photos_count FROM users ORDER BY name").fetchall()
 
 def user_exists(name):
     conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT id FROM users WHERE name = ?", (name,))
-    row = cur.fetchone()
-    conn.close()
+    row = conn.execute("SELECT id FROM users WHERE name = ?", (name,)).fetchone()
     return row is not None
 
 def increment_photo_count(user_name):
     conn = _get_conn()
-    cur = conn.cursor()
     try:
-        cur.execute(
-            "UPDATE users SET photos_count = photos_count + 1 WHERE name = ?",
-            (user_name,)
-        )
-        conn.commit()
+        with conn:
+            conn.execute(
+                "UPDATE users SET photos_count = photos_count + 1 WHERE name = ?",
+                (user_name,)
+            )
     except Exception as e:
         print(f"Error al actualizar contador de fotos: {e}")
-    finally:
-        conn.close()
\ No newline at end of file
+
+def _user_id(conn, user_name):
+    row = conn.execute("SELECT id FROM users WHERE name = ?", (user_name,)).fetchone()
+    return row[0] if row is not None else None
+
+def list_photos(user_name):
+    """
+    Fotos catalogadas de un usuario en orden de captura
+
+    Returns:
+        list: (ruta, tamaño, mtime, fecha de captura, sha1) por foto
+    """
+    return _get_conn().execute(
+        "SELECT p.path, p.size, p.mtime, p.captured_at, p.sha1 FROM photos p "
+        "JOIN users u ON u.id = p.user_id WHERE u.name = ? ORDER BY p.id",
+        (user_name,)
+    ).fetchall()
+
+def count_photos(user_name):
+    return _get_conn().execute(
+        "SELECT COUNT(*) FROM photos p JOIN users u ON u.id = p.user_id WHERE u.name = ?",
+        (user_name,)
+    ).fetchone()[0]
+
+def _next_photo_number(user_name):
+    """Siguiente número libre para N.jpg (el mayor catalogado + 1, sin pisar huecos)"""
+    stems = (os.path.splitext(os.path.basename(row[0]))[0] for row in list_photos(user_name))
+    return max((int(stem) for stem in stems if stem.isdigit()), default=0) + 1
+
+def _file_sha1(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _catalog_dir(base_dir):
+    """
+    Forma canónica de base_dir para las rutas del catálogo
+
+    "./data", "data/" y la ruta absoluta de data quedan todas como "data", así
+    una misma foto nunca se cataloga con dos rutas distintas.
+    """
+    path = os.path.abspath(base_dir)
+    try:
+        return os.path.relpath(path)
+    except ValueError:
+        # En Windows, otra unidad no tiene ruta relativa
+        return path
+
+def _reconcile(conn, base_dir):
+    """
+    Sincroniza users y photos con las carpetas de base_dir
+
+    Solo recalcula el sha1 de las fotos nuevas o cuyo tamaño o mtime cambió.
+    Las fotos catalogadas fuera de base_dir no se tocan.
+
+    Returns:
+        dict: {"users", "added", "updated", "removed"}
+    """
+    base_dir = _catalog_dir(base_dir)
+    prefix = os.path.join(base_dir, "")
+    known = {path: (size, mtime) for path, size, mtime in
+             conn.execute("SELECT path, size, mtime FROM photos") if path.startswith(prefix)}
+    stats = {"users": 0, "added": 0, "updated": 0, "removed": 0}
+    seen = set()
+    user_dirs = sorted(entry.name for entry in os.scandir(base_dir)
+                       if entry.is_dir()) if os.path.isdir(base_dir) else []
+    with conn:
+        for user_name in user_dirs:
+            user_dir = os.path.join(base_dir, user_name)
+            photos = sorted((entry for entry in os.scandir(user_dir)
+                             if entry.is_file() and entry.name.lower().endswith(PHOTO_EXTENSIONS)),
+                            key=lambda entry: entry.name)
+            packed = scan_pack(pack_path(user_dir)) if os.path.exists(pack_path(user_dir)) else []
+            if not photos and not packed:
+                continue
+            stats["users"] += 1
+            conn.execute(
+                "INSERT OR IGNORE INTO users (name, created_at, photos_count) VALUES (?, ?, ?)",
+                (user_name, datetime.utcnow().isoformat(), 0)
+            )
+            user_id = _user_id(conn, user_name)
+            for entry in photos:
+                path = os.path.join(user_dir, entry.name)
+                stat = entry.stat()
+                seen.add(path)
+                previous = known.get(path)
+                if previous == (stat.st_size, stat.st_mtime):
+                    continue
+                conn.execute(
+                    "INSERT INTO photos (user_id, path, captured_at, size, mtime, sha1) "
+                    "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(path) DO UPDATE SET "
+                    "user_id = excluded.user_id, size = excluded.size, "
+                    "mtime = excluded.mtime, sha1 = excluded.sha1",
+                    (user_id, path, datetime.utcfromtimestamp(stat.st_mtime).isoformat(),
+                     stat.st_size, stat.st_mtime, _file_sha1(path))
+                )
+                stats["added" if previous is None else "updated"] += 1
+            # Los registros de un pack no cambian: solo se agregan los que faltan
+            for path in packed:
+                seen.add(path)
+                if path in known:
+                    continue
+                data = read_photo_bytes(path)
+                conn.execute(
+                    "INSERT INTO photos (user_id, path, captured_at, size, mtime, sha1) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (user_id, path, None, len(data), None, hashlib.sha1(data).hexdigest())
+                )
+                stats["added"] += 1
+        missing = [(path,) for path in known if path not in seen]
+        conn.executemany("DELETE FROM photos WHERE path = ?", missing)
+        stats["removed"] = len(missing)
+        conn.execute("UPDATE users SET photos_count = "
+                     "(SELECT COUNT(*) FROM photos WHERE photos.user_id = users.id)")
+        conn.execute(f"PRAGMA user_version = {PHOTO_CATALOG_VERSION}")
+    Logger.info(f"Catálogo de fotos: {stats['added']} nuevas, {stats['updated']} modificadas "
+                f"y {stats['removed']} eliminadas en {stats['users']} usuarios")
+    return stats
+
+def reconcile_photos(base_dir=PHOTOS_DIR):
+    """Reconstruye el catálogo de fotos desde el disco (ver _reconcile)"""
+    return _reconcile(_get_conn(), base_dir)
+
+def pack_user_photos(user_name, base_dir=PHOTOS_DIR):
+    """
+    Mueve las fotos sueltas catalogadas de un usuario a su pack
+
+    El catálogo se actualiza en una transacción y los archivos sueltos se
+    borran después; si algo falla el pack vuelve a su tamaño anterior.
+
+    Returns:
+        int: Fotos empaquetadas
+    """
+    loose = [row for row in list_photos(user_name) if not is_packed(row[0])]
+    if not loose:
+        return 0
+    pack_file = pack_path(os.path.join(_catalog_dir(base_dir), user_name))
+    start = os.path.getsize(pack_file) if os.path.exists(pack_file) else 0
+    moved = []
+    conn = _get_conn()
+    try:
+        for path, *_ in loose:
+            moved.append((append_to_pack(pack_file, read_photo_bytes(path)), time.time(), path))
+        with conn:
+            conn.executemany("UPDATE photos SET path = ?, mtime = ? WHERE path = ?", moved)
+    except Exception:
+        truncate_pack(pack_file, start)
+        raise
+    for _, _, path in moved:
+        try:
+            os.remove(path)
+        except OSError as e:
+            Logger.warning(f"No se pudo borrar {path}: {e}")
+    Logger.info(f"{len(moved)} fotos de {user_name} empaquetadas en {pack_file}")
+    return len(moved)
+
+class RegistrationSession:
+    """
+    Fotos de una sesión de registro que se confirman juntas
+
+    add_photo() guarda cada imagen en disco (un N.jpg o un registro al final
+    del pack del usuario, según PHOTO_STORAGE); commit() crea el usuario si no
+    existe, registra todas las fotos y suma el contador en una sola
+    transacción. rollback() (o salir del with con una excepción) borra las
+    imágenes de la sesión y no toca la base de datos.
+    """
+
+    def __init__(self, user_name, base_dir="data"):
+        self.user_name = user_name
+        base_dir = _catalog_dir(base_dir)
+        self._created_folder = not os.path.exists(os.path.join(base_dir, user_name))
+        self.user_folder = ensure_user_folder(base_dir, user_name)
+        self.packed = PHOTO_STORAGE == "pack"
+        # Tamaño del pack antes de la sesión, para deshacerla truncándolo
+        self._pack_start = None
+        self._next_number = _next_photo_number(user_name)
+        self.photos = []
+        self.closed = False
+        self.committed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.closed:
+            return False
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
+    def __len__(self):
+        return len(self.photos)
+
+    def add_photo(self, image):
+        """
+        Guarda la imagen con el próximo número libre
+
+        Returns:
+            str: Ruta de la imagen guardada
+        """
+        if self.closed:
+            raise RuntimeError("La sesión de registro ya fue cerrada")
+        ok, encoded = cv2.imencode(".jpg", image)
+        if not ok:
+            raise IOError(f"No se pudo codificar la foto de {self.user_name}")
+        data = encoded.tobytes()
+        if self.packed:
+            pack_file = pack_path(self.user_folder)
+            if self._pack_start is None:
+                self._pack_start = os.path.getsize(pack_file) if os.path.exists(pack_file) else 0
+            path = append_to_pack(pack_file, data)
+            size, mtime = len(data), time.time()
+        else:
+            path = os.path.join(self.user_folder, f"{self._next_number}.jpg")
+            # Un archivo sin catalogar (copiado a mano) no se pisa
+            while os.path.exists(path):
+                self._next_number += 1
+                path = os.path.join(self.user_folder, f"{self._next_number}.jpg")
+            with open(path, "wb") as f:
+                f.write(data)
+            stat = os.stat(path)
+            size, mtime = stat.st_size, stat.st_mtime
+            self._next_number += 1
+        self.photos.append((path, datetime.utcnow().isoformat(), size, mtime,
+                            hashlib.sha1(data).hexdigest()))
+        return path
+
+    def commit(self):
+        """
+        Confirma usuario, fotos y contador en una transacción
+
+        Returns:
+            bool: True si se confirmó; si falla se deshace la sesión completa
+        """
+        if self.closed:
+            return False
+        conn = _get_conn()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR IGNORE INTO users (name, created_at, photos_count) VALUES (?, ?, ?)",
+                    (self.user_name, datetime.utcnow().isoformat(), 0)
+                )
+                user_id = _user_id(conn, self.user_name)
+                conn.executemany(
+                    "INSERT OR REPLACE INTO photos (user_id, path, captured_at, size, mtime, sha1) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [(user_id,) + photo for photo in self.photos]
+                )
+                conn.execute(
+                    "UPDATE users SET photos_count = photos_count + ? WHERE id = ?",
+                    (len(self.photos), user_id)
+                )
+        except Exception as e:
+            Logger.error(f"Error al confirmar registro de {self.user_name}: {e}")
+            self.rollback()
+            return False
+        self.closed = True
+        self.committed = True
+        return True
+
+    def rollback(self):
+        """Borra las imágenes guardadas en la sesión (y la carpeta si la creó)"""
+        if self._pack_start is not None:
+            try:
+                truncate_pack(pack_path(self.user_folder), self._pack_start)
+            except OSError as e:
+                Logger.warning(f"No se pudo deshacer el pack de {self.user_name}: {e}")
+        for path, *_ in self.photos:
+            if is_packed(path):
+                continue
+            try:
+                os.remove(path)
+            except OSError as e:
+                Logger.warning(f"No se pudo borrar {path}: {e}")
+        self.photos = []
+        if self._created_folder:
+            try:
+                os.rmdir(self.user_folder)
+            except OSError:
+                pass
+        self.closed = True
@@ -0,0 +1,37 @@
+import os
+# Kivy no debe interpretar los argumentos de esta herramienta
+os.environ.setdefault("KIVY_NO_ARGS", "1")
+
+import sys
+import argparse
+from modules.database.operations import reconcile_photos, pack_user_photos, list_users, PHOTOS_DIR
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Reconstruye el catálogo de fotos (tabla photos) desde las carpetas de usuarios")
+    parser.add_argument("--carpeta", default=PHOTOS_DIR,
+                        help="Carpeta con una subcarpeta por usuario (default: data)")
+    parser.add_argument("--empaquetar", action="store_true",
+                        help="Mover después las fotos sueltas de cada usuario a su photos.pack")
+    parser.add_argument("--verificar", action="store_true",
+                        help="Reconciliar una segunda vez y fallar si agrega o cambia alguna foto")
+    args = parser.parse_args(argv)
+
+    stats = reconcile_photos(args.carpeta)
+    print(f"{stats['users']} usuarios: {stats['added']} fotos nuevas, "
+          f"{stats['updated']} modificadas, {stats['removed']} eliminadas del catálogo")
+
+    if args.empaquetar:
+        packed = sum(pack_user_photos(name, args.carpeta) for _, name, _, _ in list_users())
+        print(f"{packed} fotos empaquetadas")
+
+    if args.verificar:
+        # Con las rutas canónicas una segunda pasada no debe encontrar nada nuevo
+        again = reconcile_photos(args.carpeta)
+        changed = again["added"] + again["updated"] + again["removed"]
+        print(f"Verificación: {again['added']} nuevas, {again['updated']} modificadas, "
+              f"{again['removed']} eliminadas en la segunda pasada")
+        sys.exit(1 if changed else 0)
+
+if __name__ == "__main__":
+    main()
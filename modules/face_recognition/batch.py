@@ -0,0 +1,234 @@
+import os
+# Kivy no debe interpretar los argumentos de esta herramienta
+os.environ.setdefault("KIVY_NO_ARGS", "1")
+
+import csv
+import json
+import time
+import argparse
+import multiprocessing
+import cv2
+from kivy.logger import Logger
+from modules.face_recognition.detection import FaceDetector
+from modules.face_recognition.recognition import FaceRecognizer
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+# Imágenes por tarea y frames por segmento de video enviados a cada proceso
+IMAGES_PER_TASK = 16
+FRAMES_PER_SEGMENT = 300
+
+CSV_FIELDS = ["source", "frame", "timestamp", "x", "y", "w", "h", "name", "confidence"]
+
+# Estado de cada proceso de trabajo
+_detector = None
+_recognizer = None
+
+def _init_worker():
+    """Crea detector y reconocedor una vez por proceso"""
+    global _detector, _recognizer
+    _detector = FaceDetector()
+    _recognizer = FaceRecognizer()
+    # Cada imagen se evalúa con sus propios píxeles, sin reutilizar resultados
+    _recognizer.cache = None
+    # FaceRecognizer() ya inició la carga del modelo: esperarla en vez de repetirla
+    if not _recognizer.wait_until_loaded():
+        Logger.warning("Batch: no hay modelo entrenado, solo se detectarán rostros")
+
+def _recognize(gray, faces):
+    """Lista de rostros con caja, nombre y confianza"""
+    faces = [tuple(int(v) for v in face) for face in faces]
+    if not faces:
+        return []
+    if _recognizer.is_trained:
+        results = _recognizer.predict_batch([gray[y:y+h, x:x+w] for (x, y, w, h) in faces])
+    else:
+        results = [(None, None)] * len(faces)
+    return [{"box": list(face), "name": name, "confidence": conf}
+            for face, (name, conf) in zip(faces, results)]
+
+def _process_images(paths):
+    records = []
+    for path in paths:
+        image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            records.append({"source": path, "frame": None, "timestamp": None,
+                            "error": "No se pudo leer la imagen"})
+            continue
+        faces = _detector.detect(image)
+        records.append({"source": path, "frame": None, "timestamp": None,
+                        "faces": _recognize(image, faces)})
+    return records
+
+def _process_segment(path, start, end, stride):
+    """Procesa los frames [start, end) de un video; end None llega hasta el final"""
+    cap = cv2.VideoCapture(path)
+    records = []
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        if start:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        # Cada segmento sigue rostros por su cuenta con la detección rápida
+        _detector.reset()
+        index = start
+        while end is None or index < end:
+            if (index - start) % stride:
+                if not cap.grab():
+                    break
+                index += 1
+                continue
+            ret, frame = cap.read()
+            if not ret:
+                break
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            faces = _detector.detect_fast(gray)
+            records.append({"source": path, "frame": index,
+                            "timestamp": round(index / fps, 3) if fps else None,
+                            "faces": _recognize(gray, faces)})
+            index += 1
+    finally:
+        cap.release()
+    return records
+
+def _run_task(task):
+    kind = task[0]
+    try:
+        if kind == "images":
+            return kind, _process_images(task[1])
+        return kind, _process_segment(*task[1:])
+    except Exception as e:
+        Logger.error(f"Batch: error procesando {task[1]}: {str(e)}")
+        return kind, []
+
+def collect_inputs(inputs):
+    """
+    Separa las entradas en imágenes y videos, recorriendo carpetas recursivamente
+
+    Returns:
+        tuple: (imágenes, videos) como listas ordenadas de rutas
+    """
+    images, videos = [], []
+
+    def add(path):
+        lower = path.lower()
+        if lower.endswith(IMAGE_EXTENSIONS):
+            images.append(path)
+        elif lower.endswith(VIDEO_EXTENSIONS):
+            videos.append(path)
+
+    for entry in inputs:
+        if os.path.isdir(entry):
+            for root, dirs, files in os.walk(entry):
+                dirs.sort()
+                for file_name in sorted(files):
+                    add(os.path.join(root, file_name))
+        elif os.path.isfile(entry):
+            add(entry)
+        else:
+            Logger.warning(f"Batch: entrada inexistente: {entry}")
+    return images, videos
+
+def build_tasks(images, videos, stride=1):
+    """Divide imágenes en bloques y videos en segmentos independientes"""
+    tasks = [("images", images[i:i + IMAGES_PER_TASK])
+             for i in range(0, len(images), IMAGES_PER_TASK)]
+    for path in videos:
+        cap = cv2.VideoCapture(path)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        cap.release()
+        if total <= 0:
+            # Sin conteo de frames confiable: un solo segmento secuencial
+            tasks.append(("video", path, 0, None, stride))
+            continue
+        for start in range(0, total, FRAMES_PER_SEGMENT):
+            tasks.append(("video", path, start, min(total, start + FRAMES_PER_SEGMENT), stride))
+    return tasks
+
+class _ResultWriter:
+    """Escribe registros como JSONL (uno por imagen o frame) o CSV (uno por rostro)"""
+
+    def __init__(self, path):
+        self.csv = path.lower().endswith(".csv")
+        self.file = open(path, "w", encoding="utf-8", newline="")
+        self.writer = csv.DictWriter(self.file, fieldnames=CSV_FIELDS) if self.csv else None
+        if self.writer is not None:
+            self.writer.writeheader()
+
+    def write(self, record):
+        if not self.csv:
+            self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            return
+        base = {"source": record["source"], "frame": record["frame"],
+                "timestamp": record["timestamp"]}
+        faces = record.get("faces") or []
+        if not faces:
+            self.writer.writerow(base)
+        for face in faces:
+            x, y, w, h = face["box"]
+            self.writer.writerow(dict(base, x=x, y=y, w=w, h=h, name=face["name"],
+                                      confidence=face["confidence"]))
+
+    def close(self):
+        self.file.close()
+
+def run_batch(inputs, output_path, processes=None, stride=1):
+    """
+    Detecta y reconoce rostros en imágenes y videos con un pool de procesos
+
+    Args:
+        inputs: Carpetas, imágenes o videos
+        output_path: Archivo de resultados (.csv o .jsonl)
+        processes: Procesos de trabajo (por defecto, uno por CPU)
+        stride: Procesar uno de cada N frames de video
+
+    Returns:
+        dict: Imágenes, frames y rostros procesados, segundos y rendimiento
+    """
+    images, videos = collect_inputs(inputs)
+    tasks = build_tasks(images, videos, stride)
+    processes = processes or os.cpu_count() or 1
+    stats = {"images": 0, "frames": 0, "faces": 0, "image_seconds": 0.0, "frame_seconds": 0.0}
+
+    writer = _ResultWriter(output_path)
+    start = time.perf_counter()
+    try:
+        with multiprocessing.Pool(processes, initializer=_init_worker) as pool:
+            last = start
+            # imap conserva el orden de entrada y entrega resultados a medida que terminan
+            for kind, records in pool.imap(_run_task, tasks):
+                now = time.perf_counter()
+                key = "images" if kind == "images" else "frames"
+                stats[key] += len(records)
+                stats[f"{key[:-1]}_seconds"] += now - last
+                last = now
+                for record in records:
+                    stats["faces"] += len(record.get("faces") or [])
+                    writer.write(record)
+    finally:
+        writer.close()
+
+    stats["seconds"] = time.perf_counter() - start
+    stats["images_per_s"] = stats["images"] / stats["image_seconds"] if stats["image_seconds"] else 0.0
+    stats["frames_per_s"] = stats["frames"] / stats["frame_seconds"] if stats["frame_seconds"] else 0.0
+    return stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Reconocimiento facial por lotes sobre carpetas de imágenes y videos")
+    parser.add_argument("inputs", nargs="+", help="Carpetas, imágenes o videos")
+    parser.add_argument("-o", "--output", default="resultados.jsonl",
+                        help="Archivo de salida .jsonl o .csv (default: resultados.jsonl)")
+    parser.add_argument("--procesos", type=int, default=None,
+                        help="Procesos de trabajo (default: uno por CPU)")
+    parser.add_argument("--cada", type=int, default=1,
+                        help="Procesar uno de cada N frames de video (default: 1)")
+    args = parser.parse_args(argv)
+
+    stats = run_batch(args.inputs, args.output, args.procesos, max(1, args.cada))
+    print(f"Imágenes: {stats['images']} ({stats['images_per_s']:.1f} imágenes/s)")
+    print(f"Frames:   {stats['frames']} ({stats['frames_per_s']:.1f} frames/s)")
+    print(f"Rostros:  {stats['faces']}")
+    print(f"Tiempo:   {stats['seconds']:.2f} s -> {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+import os
+# Kivy no debe interpretar los argumentos de esta herramienta
+os.environ.setdefault("KIVY_NO_ARGS", "1")
+
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+from datetime import datetime
+import cv2
+import numpy as np
+from modules.database.operations import init_db, list_photos, count_photos, RegistrationSession
+from modules.face_recognition.detection import FaceDetector
+from modules.face_recognition.lbph import (
+    active_backend, create_recognizer, NumpyLBPHRecognizer, ShardedLBPHRecognizer
+)
+from modules.face_recognition.model_store import current_bundle, read_label_map
+from modules.face_recognition.recognition import FaceRecognizer
+from modules.face_recognition.sample_cache import load_user_samples, CACHE_DIR
+from modules.face_recognition.training import build_model
+
+FRAME_SIZES = [(320, 240), (640, 480), (1280, 720)]
+# Aumento relativo de una métrica de tiempo que --comparar marca como regresión
+REGRESSION_TOLERANCE = 0.10
+
+def _summary(samples_ms):
+    """Media y percentiles de una lista de tiempos en milisegundos"""
+    values = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "min_ms": float(values.min()),
+        "runs": int(len(values)),
+    }
+
+def _time_ms(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(1000.0 * (time.perf_counter() - start))
+    return samples
+
+def _synthetic_face(rng):
+    """Patrón suave de 200x200 que hace de rostro de un usuario"""
+    coarse = rng.integers(0, 256, (25, 25), dtype=np.uint8)
+    return cv2.GaussianBlur(cv2.resize(coarse, (200, 200), interpolation=cv2.INTER_CUBIC), (5, 5), 0)
+
+def _photo_variant(face, rng):
+    """Foto de un usuario: desplazamiento, brillo y ruido sobre su patrón"""
+    dx, dy = rng.integers(-4, 5, 2)
+    shifted = np.roll(face, (int(dy), int(dx)), axis=(0, 1)).astype(np.int16)
+    shifted += rng.integers(-20, 21) + rng.integers(-8, 9, face.shape)
+    return np.clip(shifted, 0, 255).astype(np.uint8)
+
+def generate_population(users, photos, seed=0, base_dir="data"):
+    """
+    Registra users usuarios sintéticos con photos fotos cada uno
+
+    Returns:
+        dict: {usuario: patrón base} para generar consultas
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(base_dir, exist_ok=True)
+    init_db()
+    faces = {}
+    for u in range(users):
+        user_name = f"sintetico_{u:04d}"
+        faces[user_name] = _synthetic_face(rng)
+        with RegistrationSession(user_name, base_dir) as session:
+            for _ in range(photos):
+                session.add_photo(_photo_variant(faces[user_name], rng))
+    return faces
+
+def bench_detection(repeat, seed=0):
+    """FaceDetector.detect y detect_fast por tamaño de frame"""
+    rng = np.random.default_rng(seed)
+    detector = FaceDetector()
+    results = {}
+    for width, height in FRAME_SIZES:
+        frame = cv2.GaussianBlur(rng.integers(0, 256, (height, width), dtype=np.uint8), (9, 9), 0)
+        detector.detect(frame)
+        detector.reset()
+        results[f"{width}x{height}"] = {
+            "detect": _summary(_time_ms(lambda: detector.detect(frame), repeat)),
+            "detect_fast": _summary(_time_ms(lambda: detector.detect_fast(frame), repeat)),
+        }
+    return results
+
+def _measure(func):
+    """
+    Tiempo y memoria pico de func en dos corridas con el caché de muestras vacío
+
+    La memoria se mide aparte porque tracemalloc encarece cada asignación.
+    """
+    shutil.rmtree(CACHE_DIR, ignore_errors=True)
+    start = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - start
+
+    shutil.rmtree(CACHE_DIR, ignore_errors=True)
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"seconds": seconds, "peak_mb": peak / 2**20}
+
+def bench_training(user_names, faces, seed=0):
+    """Entrenamiento completo e incremental: tiempo y memoria pico"""
+    results = {"full": _measure(lambda: build_model(full_rebuild=True))}
+
+    # Una foto nueva de un usuario antes de cada corrida: lo que pasa tras cada captura
+    rng = np.random.default_rng(seed + 1)
+    user_name = user_names[0]
+
+    def add_photo_and_train():
+        with RegistrationSession(user_name) as session:
+            session.add_photo(_photo_variant(faces[user_name], rng))
+        build_model()
+
+    results["incremental"] = _measure(add_photo_and_train)
+    return results
+
+def bench_model_load(repeat):
+    """Lectura del modelo publicado y su mapa de etiquetas"""
+    bundle = current_bundle()
+
+    def load():
+        recognizer = create_recognizer()
+        recognizer.read(bundle.model_path)
+        read_label_map(bundle)
+
+    return _summary(_time_ms(load, repeat))
+
+def _gallery_recognizer(user_names):
+    """Reconocedor del motor activo entrenado solo con los usuarios dados"""
+    samples = {}
+    for user_name in user_names:
+        photos = [os.path.basename(row[0]) for row in list_photos(user_name)]
+        samples[user_name] = load_user_samples(user_name, photos)[0]
+    if active_backend() == "numpy":
+        engine = NumpyLBPHRecognizer()
+        return ShardedLBPHRecognizer({
+            user_name: (engine.compute_histograms(s), np.full(len(s), i, dtype=np.int32))
+            for i, (user_name, s) in enumerate(samples.items())})
+    recognizer = create_recognizer()
+    labels = np.concatenate([np.full(len(s), i, dtype=np.int32) for i, s in enumerate(samples.values())])
+    recognizer.train(list(np.concatenate(list(samples.values()))), labels)
+    return recognizer
+
+def bench_predict(user_names, faces, gallery_sizes, repeat, seed=0):
+    """FaceRecognizer.predict frente al número de usuarios en la galería (sin caché)"""
+    rng = np.random.default_rng(seed + 2)
+    recognizer = FaceRecognizer()
+    # La generación publicada primero, así las galerías de prueba la reemplazan
+    recognizer.wait_until_loaded()
+    cache, recognizer.cache = recognizer.cache, None
+    results = {}
+    try:
+        for size in gallery_sizes:
+            gallery = user_names[:size]
+            model = _gallery_recognizer(gallery)
+            recognizer.swap_model(model, dict(enumerate(gallery)), recognizer.generation + 1)
+            probe = _photo_variant(faces[gallery[-1]], rng)
+            recognizer.predict(probe)
+            samples = sum(count_photos(u) for u in gallery)
+            results[str(size)] = dict(_summary(_time_ms(lambda: recognizer.predict(probe), repeat)),
+                                      samples=samples)
+    finally:
+        recognizer.cache = cache
+    return results
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+def run_benchmarks(users=20, photos=10, gallery_sizes=None, repeat=30, seed=0):
+    """
+    Ejecuta la suite en un directorio temporal con una población sintética
+
+    Returns:
+        dict: Entorno, parámetros y resultados de cada operación
+    """
+    gallery_sizes = sorted({min(users, s) for s in (gallery_sizes or [users])})
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "backend": active_backend(),
+        },
+        "params": {"users": users, "photos": photos, "gallery_sizes": gallery_sizes,
+                   "repeat": repeat, "seed": seed},
+    }
+
+    previous_dir = os.getcwd()
+    work_dir = tempfile.mkdtemp(prefix="benchmark_")
+    os.chdir(work_dir)
+    try:
+        print(f"Población sintética: {users} usuarios x {photos} fotos", flush=True)
+        faces = generate_population(users, photos, seed)
+        user_names = sorted(faces)
+        print("Detección...", flush=True)
+        report["detection"] = bench_detection(repeat, seed)
+        print("Entrenamiento...", flush=True)
+        report["training"] = bench_training(user_names, faces, seed)
+        print("Carga del modelo...", flush=True)
+        report["model_load"] = bench_model_load(repeat)
+        print("Predicción...", flush=True)
+        report["predict"] = bench_predict(user_names, faces, gallery_sizes, repeat, seed)
+    finally:
+        os.chdir(previous_dir)
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return report
+
+def _flatten(node, prefix=""):
+    """Aplana el reporte a {ruta: valor} con solo las métricas de tiempo y memoria"""
+    metrics = {}
+    for key, value in node.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            metrics.update(_flatten(value, path))
+        elif key in ("mean_ms", "p50_ms", "p95_ms", "seconds", "peak_mb"):
+            metrics[path] = value
+    return metrics
+
+def compare_reports(baseline, current, tolerance=REGRESSION_TOLERANCE):
+    """
+    Compara dos reportes métrica por métrica
+
+    Returns:
+        list: (métrica, base, actual, cambio relativo, es_regresión)
+    """
+    base_metrics = _flatten({k: v for k, v in baseline.items() if k not in ("environment", "params")})
+    rows = []
+    for path, value in sorted(_flatten({k: v for k, v in current.items()
+                                        if k not in ("environment", "params")}).items()):
+        base = base_metrics.get(path)
+        if base is None or base <= 0:
+            continue
+        change = (value - base) / base
+        rows.append((path, base, value, change, change > tolerance))
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de detección, predicción, "
+                                                 "entrenamiento y carga del modelo")
+    parser.add_argument("--usuarios", type=int, default=20, help="Usuarios sintéticos (default: 20)")
+    parser.add_argument("--fotos", type=int, default=10, help="Fotos por usuario (default: 10)")
+    parser.add_argument("--galerias", default=None,
+                        help="Tamaños de galería para predict, separados por comas (default: todos)")
+    parser.add_argument("--repeticiones", type=int, default=30, help="Repeticiones por medición")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("-o", "--output", default="benchmark.json", help="Archivo JSON de resultados")
+    parser.add_argument("--comparar", default=None, help="Reporte base para detectar regresiones")
+    parser.add_argument("--tolerancia", type=float, default=REGRESSION_TOLERANCE,
+                        help="Aumento relativo tolerado antes de marcar regresión (default: 0.10)")
+    args = parser.parse_args(argv)
+
+    gallery_sizes = [int(s) for s in args.galerias.split(",")] if args.galerias else None
+    report = run_benchmarks(args.usuarios, args.fotos, gallery_sizes, args.repeticiones, args.semilla)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Resultados -> {args.output}")
+
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = 0
+        for path, base, value, change, regression in compare_reports(baseline, report, args.tolerancia):
+            regressions += regression
+            mark = "  REGRESIÓN" if regression else ""
+            print(f"{path:<45} {base:>10.3f} -> {value:>10.3f} ({100 * change:+.1f}%){mark}")
+        sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
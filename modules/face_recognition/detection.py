@@ -1,14 +1,188 @@
 import cv2
 import os
+import math
+import time
 
 HAAR_PATH = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
 
+# Ventana mínima del clasificador Haar frontal (24x24)
+HAAR_WINDOW = 24
+# Ancho aproximado de un rostro adulto y campo de visión horizontal típico de una webcam
+FACE_WIDTH_M = 0.16
+CAMERA_HFOV_DEG = 60.0
+
+def face_size_range(frame_width, min_distance_m=0.3, max_distance_m=2.5,
+                    hfov_deg=CAMERA_HFOV_DEG):
+    """
+    Tamaño esperado del rostro en píxeles según la distancia a la cámara
+
+    Returns:
+        tuple: (min_px, max_px) para un rostro entre max_distance_m y min_distance_m
+    """
+    focal_px = frame_width / (2.0 * math.tan(math.radians(hfov_deg) / 2.0))
+    min_px = int(focal_px * FACE_WIDTH_M / max_distance_m)
+    max_px = int(focal_px * FACE_WIDTH_M / min_distance_m)
+    return max(HAAR_WINDOW, min_px), max_px
+
 class FaceDetector:
-    def __init__(self):
+    def __init__(self, downscale=0.5, full_scan_every=10, roi_margin=0.5,
+                 min_distance_m=0.3, max_distance_m=2.5):
         if not os.path.exists(HAAR_PATH):
             raise FileNotFoundError("No se encontró el clasificador Haarcascade.")
         self.detector = cv2.CascadeClassifier(HAAR_PATH)
 
+        # Parámetros del modo rápido (detect_fast)
+        self.downscale = downscale
+        self.full_scan_every = full_scan_every
+        self.roi_margin = roi_margin
+        self.min_distance_m = min_distance_m
+        self.max_distance_m = max_distance_m
+        self._last_faces = []
+        self._frames_since_full_scan = 0
+
     def detect(self, gray_frame, scaleFactor=1.3, minNeighbors=5):
         faces = self.detector.detectMultiScale(gray_frame, scaleFactor, minNeighbors)
         return faces
+
+    def detect_fast(self, gray_frame, scaleFactor=1.3, minNeighbors=5):
+        """
+        Detección sobre el frame reducido, buscando solo alrededor de los
+        últimos rostros entre barridos completos periódicos
+
+        Returns:
+            list: Rectángulos (x, y, w, h) en coordenadas del frame original
+        """
+        min_px, max_px = face_size_range(gray_frame.shape[1], self.min_distance_m,
+                                         self.max_distance_m)
+        # No reducir tanto que el rostro más lejano quede por debajo de la ventana Haar
+        scale = min(1.0, max(self.downscale, HAAR_WINDOW / float(min_px)))
+
+        faces = []
+        if self._last_faces and self._frames_since_full_scan < self.full_scan_every:
+            self._frames_since_full_scan += 1
+            for region in self._search_regions(gray_frame.shape):
+                faces.extend(self._detect_scaled(gray_frame, region, scale, min_px, max_px,
+                                                 scaleFactor, minNeighbors))
+            faces = self._merge(faces)
+
+        # Sin rostros en las regiones (o barrido programado): frame completo
+        if not faces:
+            self._frames_since_full_scan = 0
+            faces = self._detect_scaled(gray_frame, None, scale, min_px, max_px,
+                                        scaleFactor, minNeighbors)
+
+        self._last_faces = faces
+        return faces
+
+    def reset(self):
+        """Olvida los rostros previos; el próximo detect_fast barre el frame completo"""
+        self._last_faces = []
+        self._frames_since_full_scan = 0
+
+    def _search_regions(self, shape):
+        """Regiones (x0, y0, x1, y1) alrededor de los últimos rostros"""
+        height, width = shape[:2]
+        regions = []
+        for (x, y, w, h) in self._last_faces:
+            mx, my = int(w * self.roi_margin), int(h * self.roi_margin)
+            regions.append((max(0, x - mx), max(0, y - my),
+                            min(width, x + w + mx), min(height, y + h + my)))
+        return regions
+
+    def _detect_scaled(self, gray_frame, region, scale, min_px, max_px,
+                       scaleFactor, minNeighbors):
+        """Ejecuta detectMultiScale sobre una región reducida y devuelve cajas a escala completa"""
+        x0, y0 = 0, 0
+        image = gray_frame
+        if region is not None:
+            x0, y0, x1, y1 = region
+            image = gray_frame[y0:y1, x0:x1]
+        if scale < 1.0:
+            image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        min_side = max(HAAR_WINDOW, int(min_px * scale))
+        max_side = max(min_side, int(max_px * scale))
+        if image.shape[0] < min_side or image.shape[1] < min_side:
+            return []
+
+        found = self.detector.detectMultiScale(image, scaleFactor, minNeighbors,
+                                               minSize=(min_side, min_side),
+                                               maxSize=(max_side, max_side))
+        return [(int(x / scale) + x0, int(y / scale) + y0, int(w / scale), int(h / scale))
+                for (x, y, w, h) in found]
+
+    @staticmethod
+    def _merge(faces):
+        """Descarta duplicados cuando las regiones de búsqueda se solapan"""
+        merged = []
+        for face in sorted(faces, key=lambda f: f[2] * f[3], reverse=True):
+            x, y, w, h = face
+            cx, cy = x + w / 2.0, y + h / 2.0
+            if not any(abs(cx - (mx + mw / 2.0)) < mw / 2.0 and abs(cy - (my + mh / 2.0)) < mh / 2.0
+                       for (mx, my, mw, mh) in merged):
+                merged.append(face)
+        return merged
+
+def benchmark_detection(frames, detector=None):
+    """
+    Compara detect() contra detect_fast() sobre una secuencia de frames
+
+    Args:
+        frames: Iterable de frames BGR o en gris
+        detector: FaceDetector opcional
+
+    Returns:
+        dict: Tiempos medios por frame (ms), rostros encontrados y ahorro porcentual
+    """
+    detector = detector or FaceDetector()
+    detector.reset()
+    full_time = fast_time = 0.0
+    full_faces = fast_faces = count = 0
+
+    for frame in frames:
+        gray = frame if len(frame.shape) == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        start = time.perf_counter()
+        full_faces += len(detector.detect(gray))
+        full_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        fast_faces += len(detector.detect_fast(gray))
+        fast_time += time.perf_counter() - start
+        count += 1
+
+    if count == 0:
+        return {"frames": 0}
+    return {
+        "frames": count,
+        "full_ms": 1000.0 * full_time / count,
+        "fast_ms": 1000.0 * fast_time / count,
+        "full_faces": full_faces,
+        "fast_faces": fast_faces,
+        "saved_pct": 100.0 * (1.0 - fast_time / full_time) if full_time > 0 else 0.0,
+    }
+
+def _video_frames(path):
+    """Itera los frames de un archivo de video"""
+    cap = cv2.VideoCapture(path)
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield frame
+    finally:
+        cap.release()
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) != 2:
+        print("Uso: python -m modules.face_recognition.detection <video>")
+        sys.exit(1)
+    stats = benchmark_detection(_video_frames(sys.argv[1]))
+    if stats["frames"] == 0:
+        print("El video no tiene frames")
+        sys.exit(1)
+    print(f"Frames: {stats['frames']}")
+    print(f"Completo: {stats['full_ms']:.2f} ms/frame ({stats['full_faces']} rostros)")
+    print(f"Rápido:   {stats['fast_ms']:.2f} ms/frame ({stats['fast_faces']} rostros)")
+    print(f"Ahorro:   {stats['saved_pct']:.1f}%")
@@ -0,0 +1,576 @@
+import os
+import cv2
+import json
+import struct
+import numpy as np
+from kivy.logger import Logger
+
+# "opencv": cv2.face.LBPHFaceRecognizer si está instalado opencv-contrib; si no,
+#           se usa el motor NumPy
+# "numpy": forzar el motor incluido (no requiere opencv-contrib)
+RECOGNITION_BACKEND = "opencv"
+
+# Memoria aproximada (bytes) por bloque de la galería al calcular distancias;
+# un bloque que cabe en la caché L2 se lee una vez de la RAM para todas las consultas
+_CHUNK_BYTES = 256 * 1024
+# Imágenes por tanda al calcular histogramas
+_LBP_BATCH = 64
+
+# Formato binario .lbph: cabecera fija + histogramas float32 contiguos + etiquetas int32
+MODEL_MAGIC = b"LBPH"
+MODEL_VERSION = 1
+_HEADER = struct.Struct("<4sIIIIIQQ")  # magic, versión, radio, vecinos, grid_x, grid_y, muestras, dimensión
+HEADER_SIZE = 64
+
+# El aviso de motor NumPy por falta de cv2.face se registra una sola vez
+_fallback_logged = False
+
+# Galería consolidada de una generación de shards: todos los histogramas en un
+# solo .lbph mapeable (GALLERY_NAME) y las filas de cada usuario (GALLERY_INDEX)
+GALLERY_NAME = "gallery.base"
+GALLERY_INDEX = "gallery.json"
+# Shards sueltos (posteriores a la galería consolidada) que se mapean en memoria;
+# cada mapeo mantiene abierto un descriptor de archivo. Con más, el entrenamiento
+# vuelve a consolidar y la carga los lee a memoria
+MAX_LOOSE_SHARDS = 32
+# Fracción de filas descartadas (usuarios reemplazados o eliminados) de la
+# galería consolidada a partir de la cual se vuelve a consolidar
+MAX_STALE_FRACTION = 0.25
+# Los shards se mapean en memoria salvo en Windows, donde un archivo mapeado
+# no se puede reemplazar mientras el reconocedor lo tiene abierto
+SHARD_MMAP = os.name != "nt"
+
+def chi_square_distances(query_histograms, gallery):
+    """
+    Distancia chi-cuadrado (HISTCMP_CHISQR_ALT) de cada consulta contra una galería
+
+    Usa (a - b)² / (a + b) = a + b - 4ab / (a + b): el último término solo es
+    distinto de cero donde la consulta lo es, así que por consulta se procesan
+    únicamente sus columnas no nulas, en buffers reutilizados y sin temporales.
+
+    Args:
+        query_histograms: Matriz M x D
+        gallery: Matriz N x D (puede ser un np.memmap) o lista de matrices, que
+                 se comparan como si fueran sus filas concatenadas
+
+    Returns:
+        np.ndarray: M x N float32
+    """
+    queries = np.asarray(query_histograms, dtype=np.float32)
+    if queries.ndim == 1:
+        queries = queries[np.newaxis]
+    parts = gallery if isinstance(gallery, (list, tuple)) else [gallery]
+    dim = queries.shape[1]
+    result = np.empty((queries.shape[0], sum(len(part) for part in parts)), dtype=np.float32)
+    columns = [np.flatnonzero(query) for query in queries]
+    values = [query[cols] for query, cols in zip(queries, columns)]
+    query_sums = queries.sum(axis=1)
+
+    chunk = max(1, _CHUNK_BYTES // (dim * 4))
+    gathered = np.empty((chunk, dim), dtype=np.float32)
+    totals = np.empty_like(gathered)
+    offset = 0
+    for part in parts:
+        for start in range(0, len(part), chunk):
+            block = part[start:start + chunk]
+            rows = len(block)
+            block_sums = block.sum(axis=1)
+            first = offset + start
+            for i, (cols, query) in enumerate(zip(columns, values)):
+                g = gathered[:rows, :len(cols)]
+                t = totals[:rows, :len(cols)]
+                np.take(block, cols, axis=1, out=g)
+                np.add(g, query, out=t)
+                np.multiply(g, query, out=g)
+                np.divide(g, t, out=g)
+                result[i, first:first + rows] = block_sums + query_sums[i] - 4.0 * g.sum(axis=1)
+        offset += len(part)
+    result *= 2.0
+    return result
+
+class NumpyLBPHRecognizer:
+    """
+    LBPH vectorizado con NumPy, compatible con la API de cv2.face.LBPHFaceRecognizer
+
+    Usa los mismos parámetros por defecto que OpenCV (radio 1, 8 vecinos,
+    rejilla 8x8) y la misma distancia chi-cuadrado, de modo que las
+    confianzas quedan en la misma escala.
+    """
+    # predict/predict_batch solo leen la galería: una instancia sirve a varios hilos
+    thread_safe = True
+
+    def __init__(self, radius=1, neighbors=8, grid_x=8, grid_y=8):
+        self.radius = radius
+        self.neighbors = neighbors
+        self.grid_x = grid_x
+        self.grid_y = grid_y
+        self.histograms = np.empty((0, self.histogram_size), dtype=np.float32)
+        self.labels = np.empty(0, dtype=np.int32)
+
+    @property
+    def histogram_size(self):
+        return self.grid_x * self.grid_y * (1 << self.neighbors)
+
+    def compute_histograms(self, images):
+        """
+        Calcula los histogramas espaciales LBP de un lote de imágenes
+
+        Args:
+            images: Arreglo N x H x W o lista de imágenes en gris del mismo tamaño
+
+        Returns:
+            np.ndarray: N x histogram_size float32, cada celda normalizada a suma 1
+        """
+        batch = np.asarray(images)
+        if batch.ndim == 2:
+            batch = batch[np.newaxis]
+        if len(batch) == 0:
+            return np.empty((0, self.histogram_size), dtype=np.float32)
+        # Por tandas: los códigos LBP (int32) de todo el lote no quedan en memoria a la vez
+        return np.concatenate([self._spatial_histogram(self._lbp(batch[start:start + _LBP_BATCH]))
+                               for start in range(0, len(batch), _LBP_BATCH)])
+
+    def _neighbor_kernels(self):
+        """Núcleo de interpolación bilineal de cada vecino, para cv2.filter2D"""
+        r = self.radius
+        kernels = []
+        for bit in range(self.neighbors):
+            x = r * np.cos(2.0 * np.pi * bit / self.neighbors)
+            y = -r * np.sin(2.0 * np.pi * bit / self.neighbors)
+            fx, fy = int(np.floor(x)), int(np.floor(y))
+            cx, cy = int(np.ceil(x)), int(np.ceil(y))
+            tx, ty = x - fx, y - fy
+            kernel = np.zeros((2 * r + 1, 2 * r + 1), dtype=np.float32)
+            kernel[r + fy, r + fx] += (1 - tx) * (1 - ty)
+            kernel[r + fy, r + cx] += tx * (1 - ty)
+            kernel[r + cy, r + fx] += (1 - tx) * ty
+            kernel[r + cy, r + cx] += tx * ty
+            kernels.append(kernel)
+        return kernels
+
+    def _lbp(self, batch):
+        """
+        LBP circular con interpolación bilineal (equivalente a elbp de OpenCV)
+
+        Cada vecino interpolado es un filtro lineal del rostro: se calcula con
+        cv2.filter2D imagen por imagen, sin temporales del tamaño del lote.
+        """
+        r = self.radius
+        n, rows, cols = batch.shape
+        codes = np.zeros((n, rows - 2 * r, cols - 2 * r), dtype=np.int32)
+        kernels = self._neighbor_kernels()
+        eps = np.finfo(np.float32).eps
+
+        for image, image_codes in zip(batch, codes):
+            image = image.astype(np.float32)
+            center = image[r:rows - r, r:cols - r]
+            for bit, kernel in enumerate(kernels):
+                value = cv2.filter2D(image, -1, kernel, borderType=cv2.BORDER_CONSTANT)
+                value = value[r:rows - r, r:cols - r]
+                mask = (value > center) | (np.abs(value - center) < eps)
+                image_codes |= mask.astype(np.int32) << bit
+        return codes
+
+    def _spatial_histogram(self, codes):
+        """Histograma por celda de la rejilla con un solo bincount para todo el lote"""
+        n, rows, cols = codes.shape
+        bins = 1 << self.neighbors
+        cell_h, cell_w = rows // self.grid_y, cols // self.grid_x
+        cells = codes[:, :cell_h * self.grid_y, :cell_w * self.grid_x]
+        cells = cells.reshape(n, self.grid_y, cell_h, self.grid_x, cell_w)
+        cells = cells.transpose(0, 1, 3, 2, 4).reshape(n, self.grid_y * self.grid_x, -1)
+
+        offsets = np.arange(n * self.grid_y * self.grid_x, dtype=np.int64).reshape(n, -1, 1) * bins
+        counts = np.bincount((cells + offsets).ravel(), minlength=n * self.histogram_size)
+        hist = counts.reshape(n, self.histogram_size).astype(np.float32)
+        hist /= float(cell_h * cell_w)
+        return hist
+
+    def train(self, images, labels):
+        """Reemplaza la galería con las imágenes dadas"""
+        self.histograms = np.ascontiguousarray(self.compute_histograms(images))
+        self.labels = np.asarray(labels, dtype=np.int32).ravel()
+
+    def update(self, images, labels):
+        """Agrega muestras a la galería existente"""
+        self.histograms = np.ascontiguousarray(
+            np.concatenate([self.histograms, self.compute_histograms(images)]))
+        self.labels = np.concatenate([self.labels, np.asarray(labels, dtype=np.int32).ravel()])
+
+    def distances(self, query_histograms):
+        """Distancia chi-cuadrado de cada consulta contra toda la galería (M x N)"""
+        return chi_square_distances(query_histograms, self.histograms)
+
+    def predict_batch(self, images):
+        """
+        Identifica un lote de rostros en una sola pasada
+
+        Returns:
+            tuple: (etiquetas, distancias) como arreglos de longitud M
+        """
+        if self.histograms.shape[0] == 0:
+            raise ValueError("El modelo no tiene muestras entrenadas")
+        dist = self.distances(self.compute_histograms(images))
+        best = dist.argmin(axis=1)
+        return self.labels[best], dist[np.arange(len(best)), best]
+
+    def predict(self, image):
+        """Misma firma que cv2.face: devuelve (etiqueta, distancia)"""
+        labels, dists = self.predict_batch([image])
+        return int(labels[0]), float(dists[0])
+
+    def save(self, path):
+        """Guarda el modelo en el formato binario .lbph"""
+        write_model(path, self.histograms, self.labels,
+                    (self.radius, self.neighbors, self.grid_x, self.grid_y))
+
+    def write(self, path):
+        self.save(path)
+
+    def read(self, path):
+        """
+        Carga un modelo .lbph (mapeado en memoria), .npz o YAML de OpenCV
+
+        Con .lbph la carga es casi instantánea: las páginas de la galería se leen
+        del disco recién cuando predict las necesita.
+        """
+        with open(path, "rb") as f:
+            magic = f.read(4)
+
+        if magic == MODEL_MAGIC:
+            params, self.histograms, self.labels = open_model(path)
+        elif magic[:2] == b"PK":
+            with np.load(path) as data:
+                params = tuple(int(v) for v in data["params"])
+                self.histograms = np.ascontiguousarray(data["histograms"], dtype=np.float32)
+                self.labels = data["labels"].astype(np.int32)
+        else:
+            params, self.histograms, self.labels = _read_yaml_model(path)
+        self.radius, self.neighbors, self.grid_x, self.grid_y = params
+
+def write_model(path, histograms, labels, params):
+    """
+    Escribe un modelo .lbph
+
+    Args:
+        path: Archivo destino
+        histograms: Matriz N x D float32, o lista de matrices que se escriben
+                    una tras otra sin concatenarlas en memoria
+        labels: Vector de N etiquetas
+        params: (radio, vecinos, grid_x, grid_y)
+    """
+    blocks = histograms if isinstance(histograms, (list, tuple)) else [histograms]
+    labels = np.ascontiguousarray(labels, dtype=np.int32).ravel()
+    radius, neighbors, grid_x, grid_y = params
+    dim = blocks[0].shape[1] if blocks else grid_x * grid_y * (1 << neighbors)
+    header = _HEADER.pack(MODEL_MAGIC, MODEL_VERSION, *params, len(labels), dim)
+    with open(path, "wb") as f:
+        f.write(header.ljust(HEADER_SIZE, b"\0"))
+        for block in blocks:
+            np.ascontiguousarray(block, dtype=np.float32).tofile(f)
+        labels.tofile(f)
+
+def open_model(path, mmap=True):
+    """
+    Mapea en memoria un modelo .lbph sin leer los histogramas
+
+    Args:
+        path: Archivo .lbph
+        mmap: False para leerlo completo y no dejar el archivo mapeado
+
+    Returns:
+        tuple: (params, histogramas memmap N x D, etiquetas N)
+    """
+    with open(path, "rb") as f:
+        magic, version, radius, neighbors, grid_x, grid_y, count, dim = \
+            _HEADER.unpack(f.read(_HEADER.size))
+    if magic != MODEL_MAGIC or version != MODEL_VERSION:
+        raise ValueError(f"Formato de modelo no soportado: {path}")
+
+    if count == 0:
+        histograms = np.empty((0, dim), dtype=np.float32)
+        labels = np.empty(0, dtype=np.int32)
+    elif not mmap:
+        with open(path, "rb") as f:
+            f.seek(HEADER_SIZE)
+            histograms = np.fromfile(f, dtype=np.float32, count=count * dim).reshape(count, dim)
+            labels = np.fromfile(f, dtype=np.int32, count=count)
+    else:
+        histograms = np.memmap(path, dtype=np.float32, mode="r",
+                               offset=HEADER_SIZE, shape=(count, dim))
+        labels = np.array(np.memmap(path, dtype=np.int32, mode="r",
+                                    offset=HEADER_SIZE + count * dim * 4, shape=(count,)))
+    return (radius, neighbors, grid_x, grid_y), histograms, labels
+
+def _read_yaml_model(path):
+    """Lee el YAML de cv2.face.LBPHFaceRecognizer con cv2.FileStorage (no requiere contrib)"""
+    fs = cv2.FileStorage(path, cv2.FILE_STORAGE_READ)
+    try:
+        root = fs.getNode("opencv_lbphfaces")
+        if root.empty():
+            raise ValueError(f"No es un modelo LBPH de OpenCV: {path}")
+        params = tuple(int(root.getNode(key).real())
+                       for key in ("radius", "neighbors", "grid_x", "grid_y"))
+        node = root.getNode("histograms")
+        rows = [node.at(i).mat().ravel() for i in range(node.size())]
+        dim = rows[0].size if rows else params[2] * params[3] * (1 << params[1])
+        histograms = np.empty((len(rows), dim), dtype=np.float32)
+        for i, row in enumerate(rows):
+            histograms[i] = row
+        labels_mat = root.getNode("labels").mat()
+        labels = (labels_mat.ravel() if labels_mat is not None else np.empty(0)).astype(np.int32)
+        return params, histograms, labels
+    finally:
+        fs.release()
+
+def convert_yaml_model(yaml_path, output_path):
+    """
+    Convierte un recognizer.yml de OpenCV al formato binario .lbph
+
+    Returns:
+        int: Número de histogramas convertidos
+    """
+    params, histograms, labels = _read_yaml_model(yaml_path)
+    temp_path = f"{output_path}.tmp"
+    write_model(temp_path, histograms, labels, params)
+    os.replace(temp_path, output_path)
+    Logger.info(f"Modelo convertido: {len(labels)} muestras -> {output_path}")
+    return len(labels)
+
+class ShardedLBPHRecognizer:
+    """
+    Galería formada por un shard .lbph por usuario
+
+    Los histogramas quedan mapeados en memoria, sin copiarlos: la galería
+    consolidada de la generación (GALLERY_NAME) más un bloque por cada shard
+    escrito después de consolidar. predict_batch compara el lote contra todos
+    los bloques en una sola llamada a chi_square_distances. Las filas de la
+    galería consolidada de un usuario reemplazado o eliminado llevan etiqueta
+    -1 y nunca se eligen.
+    """
+    thread_safe = True
+
+    def __init__(self, shards=None, base=None, base_rows=None):
+        """
+        Args:
+            shards: {usuario: (histogramas, etiquetas)} en bloques propios
+            base: (histogramas, etiquetas) de la galería consolidada o None
+            base_rows: {usuario: (inicio, fin)} de sus filas vigentes en base
+        """
+        self.engine = NumpyLBPHRecognizer()
+        self.shards = dict(shards or {})
+        self.base = base
+        self.base_rows = dict(base_rows or {})
+        self._assemble()
+
+    def _assemble(self):
+        """Lista de bloques y vector de etiquetas alineado con sus filas concatenadas"""
+        blocks, labels = [], []
+        if self.base is not None:
+            histograms, base_labels = self.base
+            # Solo cuentan las filas de usuarios cuyo shard no cambió desde la consolidación
+            valid = np.full(len(base_labels), -1, dtype=np.int32)
+            for start, end in self.base_rows.values():
+                valid[start:end] = base_labels[start:end]
+            blocks.append(histograms)
+            labels.append(valid)
+        for histograms, shard_labels in self.shards.values():
+            blocks.append(histograms)
+            labels.append(np.asarray(shard_labels, dtype=np.int32))
+        self.blocks = blocks
+        self.labels = np.concatenate(labels) if labels else np.empty(0, dtype=np.int32)
+        self.sample_count = int(np.count_nonzero(self.labels >= 0))
+
+    @property
+    def stale_count(self):
+        """Filas descartadas que la galería todavía compara"""
+        return len(self.labels) - self.sample_count
+
+    def needs_consolidation(self):
+        return (len(self.shards) > MAX_LOOSE_SHARDS
+                or self.stale_count > MAX_STALE_FRACTION * max(1, len(self.labels)))
+
+    def read(self, shard_dir):
+        """Mapea la galería consolidada y los shards escritos después de ella"""
+        base, base_rows = None, read_gallery_index(shard_dir)
+        if base_rows is not None:
+            base = self._open_shard(os.path.join(shard_dir, GALLERY_NAME), SHARD_MMAP)
+        else:
+            base_rows = {}
+
+        loose = [file_name for file_name in sorted(os.listdir(shard_dir))
+                 if file_name.endswith(".lbph") and file_name[:-len(".lbph")] not in base_rows]
+        # Muchos shards sueltos (p. ej. un modelo anterior sin consolidar) se leen a memoria
+        mmap = SHARD_MMAP and len(loose) <= MAX_LOOSE_SHARDS
+        shards = {file_name[:-len(".lbph")]: self._open_shard(os.path.join(shard_dir, file_name), mmap)
+                  for file_name in loose}
+
+        self.shards, self.base, self.base_rows = shards, base, base_rows
+        self._assemble()
+
+    def _open_shard(self, path, mmap=SHARD_MMAP):
+        params, histograms, labels = open_model(path, mmap=mmap)
+        if histograms.shape[1] != self.engine.histogram_size:
+            raise ValueError(f"Shard con parámetros LBPH distintos: {path}")
+        return histograms, labels
+
+    def with_shard(self, user_name, path):
+        """
+        Copia del reconocedor con el shard de un usuario agregado o reemplazado
+
+        Solo se mapea ese shard: los demás bloques se comparten con esta instancia,
+        que no se modifica.
+        """
+        shards = dict(self.shards)
+        shards[user_name] = self._open_shard(path)
+        base_rows = {name: rows for name, rows in self.base_rows.items() if name != user_name}
+        return ShardedLBPHRecognizer(shards, self.base, base_rows)
+
+    def without_shard(self, user_name):
+        """Copia del reconocedor sin las muestras de un usuario"""
+        shards = {name: shard for name, shard in self.shards.items() if name != user_name}
+        base_rows = {name: rows for name, rows in self.base_rows.items() if name != user_name}
+        return ShardedLBPHRecognizer(shards, self.base, base_rows)
+
+    def user_rows(self):
+        """Histogramas vigentes de cada usuario, en el orden de la galería"""
+        if self.base is not None:
+            histograms, labels = self.base
+            for user_name, (start, end) in self.base_rows.items():
+                yield user_name, histograms[start:end], labels[start:end]
+        for user_name, (histograms, labels) in self.shards.items():
+            yield user_name, histograms, labels
+
+    def predict_batch(self, images):
+        """
+        Identifica un lote de rostros contra todos los bloques en una sola pasada
+
+        Returns:
+            tuple: (etiquetas, distancias) como arreglos de longitud M
+        """
+        if self.sample_count == 0:
+            raise ValueError("El modelo no tiene muestras entrenadas")
+        dist = chi_square_distances(self.engine.compute_histograms(images), self.blocks)
+        if self.stale_count:
+            dist[:, self.labels < 0] = np.inf
+        best = dist.argmin(axis=1)
+        return self.labels[best], dist[np.arange(len(best)), best]
+
+    def predict(self, image):
+        labels, dists = self.predict_batch([image])
+        return int(labels[0]), float(dists[0])
+
+def write_gallery(shard_dir, recognizer):
+    """
+    Consolida la galería vigente de un reconocedor en GALLERY_NAME
+
+    Escribe archivos nuevos (nunca modifica los enlazados desde otra generación)
+    y deja el reconocedor listo para mapearlos con read().
+
+    Returns:
+        int: Muestras consolidadas
+    """
+    rows, blocks, labels = {}, [], []
+    start = 0
+    for user_name, histograms, user_labels in recognizer.user_rows():
+        rows[user_name] = [start, start + len(user_labels)]
+        blocks.append(histograms)
+        labels.append(user_labels)
+        start += len(user_labels)
+
+    engine = recognizer.engine
+    path = os.path.join(shard_dir, GALLERY_NAME)
+    temp_path = f"{path}.tmp"
+    # Los bloques mapeados se copian al archivo uno por uno, sin juntarlos en RAM
+    write_model(temp_path, blocks, np.concatenate(labels) if labels else np.empty(0, np.int32),
+                (engine.radius, engine.neighbors, engine.grid_x, engine.grid_y))
+    os.replace(temp_path, path)
+    write_gallery_index(shard_dir, rows)
+    return start
+
+def read_gallery_index(shard_dir):
+    """
+    Returns:
+        dict: {usuario: (inicio, fin)} en la galería consolidada; None si no hay
+    """
+    path = os.path.join(shard_dir, GALLERY_INDEX)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return {name: tuple(rows) for name, rows in json.load(f)["rows"].items()}
+
+def write_gallery_index(shard_dir, rows):
+    """Escribe las filas vigentes de cada usuario en la galería consolidada"""
+    path = os.path.join(shard_dir, GALLERY_INDEX)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump({"rows": rows}, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+def shard_path(shard_dir, user_name):
+    return os.path.join(shard_dir, f"{user_name}.lbph")
+
+def write_shard(shard_dir, user_name, histograms, label_id):
+    """Escribe el shard de un usuario reemplazándolo atómicamente"""
+    os.makedirs(shard_dir, exist_ok=True)
+    path = shard_path(shard_dir, user_name)
+    engine = NumpyLBPHRecognizer()
+    temp_path = f"{path}.tmp"
+    write_model(temp_path, histograms, np.full(len(histograms), label_id, dtype=np.int32),
+                (engine.radius, engine.neighbors, engine.grid_x, engine.grid_y))
+    os.replace(temp_path, path)
+    return path
+
+def split_into_shards(model_path, label_map, shard_dir):
+    """
+    Divide un modelo monolítico (.lbph, .npz o YAML de OpenCV) en un shard por usuario
+
+    Args:
+        model_path: Modelo existente
+        label_map: {id: nombre}
+        shard_dir: Directorio destino
+
+    Returns:
+        int: Número de shards escritos
+    """
+    model = NumpyLBPHRecognizer()
+    model.read(model_path)
+    if model.histogram_size != NumpyLBPHRecognizer().histogram_size:
+        raise ValueError(f"Modelo con parámetros LBPH distintos: {model_path}")
+
+    written = 0
+    for label_id, user_name in label_map.items():
+        rows = np.flatnonzero(model.labels == label_id)
+        if len(rows):
+            write_shard(shard_dir, user_name, model.histograms[rows], label_id)
+            written += 1
+    Logger.info(f"Modelo dividido en {written} shards: {shard_dir}")
+    return written
+
+def active_backend():
+    """Motor efectivo: cv2.face si está disponible, NumPy si falta opencv-contrib"""
+    global _fallback_logged
+    if RECOGNITION_BACKEND == "opencv":
+        if hasattr(cv2, "face"):
+            return "opencv"
+        if not _fallback_logged:
+            _fallback_logged = True
+            Logger.info("cv2.face no disponible (falta opencv-contrib), usando motor NumPy")
+    return "numpy"
+
+def create_recognizer():
+    """Crea un reconocedor LBPH vacío del motor configurado"""
+    if active_backend() == "opencv":
+        return cv2.face.LBPHFaceRecognizer_create()
+    return ShardedLBPHRecognizer()
+
+def model_filename():
+    """Nombre del modelo dentro de modelos/global: YAML de OpenCV o directorio de shards"""
+    return "recognizer.yml" if active_backend() == "opencv" else "shards"
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) != 3:
+        print("Uso: python -m modules.face_recognition.lbph <recognizer.yml> <recognizer.lbph>")
+        sys.exit(1)
+    print(f"{convert_yaml_model(sys.argv[1], sys.argv[2])} histogramas convertidos")
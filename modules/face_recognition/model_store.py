@@ -0,0 +1,256 @@
+import os
+import json
+import shutil
+import threading
+from datetime import datetime
+from kivy.logger import Logger
+from modules.face_recognition.lbph import model_filename, active_backend, split_into_shards
+
+# Cada entrenamiento publica una generación completa (modelo + etiquetas + metadatos)
+# en modelos/global/gen-NNNNNN; CURRENT apunta a la generación vigente
+BUNDLE_DIR = os.path.join("modelos", "global")
+CURRENT_FILE = os.path.join(BUNDLE_DIR, "CURRENT")
+GENERATION_PREFIX = "gen-"
+# Generaciones que se conservan en disco (la vigente incluida)
+KEEP_GENERATIONS = 2
+
+LABEL_MAP_NAME = "label_map.txt"
+MANIFEST_NAME = "manifest.json"
+META_NAME = "meta.json"
+
+# Evita que dos hilos reserven o publiquen generaciones a la vez
+_lock = threading.Lock()
+_migrate_lock = threading.Lock()
+# {generación: referencias}: generaciones que un snapshot en memoria todavía
+# puede leer del disco y que la limpieza no debe borrar
+_pinned = {}
+
+class ModelBundle:
+    """Directorio de una generación del modelo"""
+
+    def __init__(self, generation, path):
+        self.generation = generation
+        self.path = path
+
+    @property
+    def model_path(self):
+        return os.path.join(self.path, model_filename())
+
+    @property
+    def label_map_path(self):
+        return os.path.join(self.path, LABEL_MAP_NAME)
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.path, MANIFEST_NAME)
+
+    @property
+    def meta_path(self):
+        return os.path.join(self.path, META_NAME)
+
+def _generation_dir(generation):
+    return os.path.join(BUNDLE_DIR, f"{GENERATION_PREFIX}{generation:06d}")
+
+def _list_generations():
+    """Números de generación presentes en disco, publicados o no"""
+    if not os.path.exists(BUNDLE_DIR):
+        return []
+    generations = []
+    for name in os.listdir(BUNDLE_DIR):
+        suffix = name[len(GENERATION_PREFIX):]
+        if name.startswith(GENERATION_PREFIX) and suffix.isdigit():
+            generations.append(int(suffix))
+    return sorted(generations)
+
+def current_generation():
+    """Número de la generación publicada, o 0 si no hay ninguna"""
+    try:
+        with open(CURRENT_FILE, "r", encoding="utf-8") as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return 0
+
+def current_bundle():
+    """
+    Generación publicada
+
+    Returns:
+        ModelBundle o None si todavía no se publicó ninguna
+    """
+    generation = current_generation()
+    if generation <= 0:
+        return None
+    path = _generation_dir(generation)
+    if not os.path.isdir(path):
+        Logger.warning(f"CURRENT apunta a una generación inexistente: {path}")
+        return None
+    return ModelBundle(generation, path)
+
+def create_bundle():
+    """Reserva el directorio de la próxima generación; no es visible hasta publicarla"""
+    with _lock:
+        os.makedirs(BUNDLE_DIR, exist_ok=True)
+        generation = max(_list_generations() + [current_generation()]) + 1
+        path = _generation_dir(generation)
+        os.makedirs(path)
+    return ModelBundle(generation, path)
+
+def discard_bundle(bundle):
+    """Elimina una generación que no llegó a publicarse"""
+    shutil.rmtree(bundle.path, ignore_errors=True)
+
+def link_file(source, destination):
+    """Enlace duro a un archivo inmutable de otra generación; copia si el sistema no lo permite"""
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+def _write_text(path, content):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+def publish_bundle(bundle, labels, files, samples=0, versions=None):
+    """
+    Escribe etiquetas y metadatos y publica la generación
+
+    La publicación es un único os.replace de CURRENT: un lector ve la generación
+    anterior completa o la nueva completa, nunca una mezcla.
+
+    Args:
+        bundle: ModelBundle con el modelo ya guardado
+        labels: {nombre: id}
+        files: {nombre: [fotos entrenadas]}
+        samples: Número de muestras del modelo
+        versions: {nombre: [[foto, photo_key], ...]} de las fotos pedidas, para
+                  detectar cambios aunque alguna foto no se pueda decodificar
+
+    Returns:
+        int: Generación publicada
+    """
+    label_lines = [f"{id_},{name}\n" for name, id_ in sorted(labels.items(), key=lambda item: item[1])]
+    _write_text(bundle.label_map_path, "".join(label_lines))
+    manifest = {"labels": labels, "files": files}
+    if versions is not None:
+        manifest["versions"] = versions
+    _write_text(bundle.manifest_path, json.dumps(manifest, ensure_ascii=False))
+    _write_text(bundle.meta_path, json.dumps({
+        "generation": bundle.generation,
+        "backend": active_backend(),
+        "model": model_filename(),
+        "users": len(labels),
+        "samples": int(samples),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+    }, ensure_ascii=False))
+
+    with _lock:
+        temp_path = f"{CURRENT_FILE}.tmp"
+        _write_text(temp_path, f"{bundle.generation}\n")
+        os.replace(temp_path, CURRENT_FILE)
+        _cleanup_generations(bundle.generation)
+    Logger.info(f"Generación {bundle.generation} del modelo publicada")
+    return bundle.generation
+
+def pin_generation(generation):
+    """Impide que la limpieza borre una generación mientras se use desde memoria"""
+    with _lock:
+        _pinned[generation] = _pinned.get(generation, 0) + 1
+
+def unpin_generation(generation):
+    """Libera una referencia de pin_generation; se borrará en la próxima limpieza"""
+    with _lock:
+        count = _pinned.get(generation, 0) - 1
+        if count > 0:
+            _pinned[generation] = count
+        else:
+            _pinned.pop(generation, None)
+
+def _cleanup_generations(current):
+    """Borra generaciones antiguas no fijadas y restos de publicaciones fallidas"""
+    keep = {current - offset for offset in range(KEEP_GENERATIONS)} | set(_pinned)
+    for generation in _list_generations():
+        if generation not in keep and generation < current:
+            shutil.rmtree(_generation_dir(generation), ignore_errors=True)
+
+def read_label_map(bundle):
+    """Lee el mapa de etiquetas de una generación como {id: nombre}"""
+    label_map = {}
+    with open(bundle.label_map_path, "r", encoding="utf-8") as f:
+        for line in f:
+            id_s, name = line.strip().split(",", 1)
+            label_map[int(id_s)] = name
+    return label_map
+
+def read_manifest(bundle):
+    """
+    Manifiesto de entrenamiento de una generación
+
+    Returns:
+        dict: {"labels": {nombre: id}, "files": {nombre: [fotos]},
+               "versions": {nombre: [[foto, photo_key], ...]}} o None
+    """
+    if bundle is None or not os.path.exists(bundle.manifest_path):
+        return None
+    try:
+        with open(bundle.manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        manifest["labels"] = {name: int(id_) for name, id_ in manifest["labels"].items()}
+        manifest.setdefault("files", {})
+        manifest.setdefault("versions", {})
+        return manifest
+    except Exception as e:
+        Logger.warning(f"Manifiesto de entrenamiento inválido: {str(e)}")
+        return None
+
+def migrate_legacy_model():
+    """
+    Publica como generación 1 un modelo con el formato anterior a las generaciones
+    (label_map.txt, manifest.json y shards o recognizer.yml sueltos en modelos/global)
+
+    Returns:
+        bool: True si se migró un modelo
+    """
+    with _migrate_lock:
+        legacy_labels = os.path.join(BUNDLE_DIR, LABEL_MAP_NAME)
+        if current_generation() > 0 or not os.path.exists(legacy_labels):
+            return False
+        return _migrate(legacy_labels)
+
+def _migrate(legacy_labels):
+    bundle = create_bundle()
+    try:
+        shutil.copy2(legacy_labels, bundle.label_map_path)
+        legacy_manifest = os.path.join(BUNDLE_DIR, MANIFEST_NAME)
+        manifest = {"labels": {}, "files": {}}
+        if os.path.exists(legacy_manifest):
+            manifest = read_manifest(ModelBundle(0, BUNDLE_DIR)) or manifest
+        label_map = read_label_map(bundle)
+        labels = manifest["labels"] or {name: id_ for id_, name in label_map.items()}
+
+        legacy_model = os.path.join(BUNDLE_DIR, model_filename())
+        if os.path.isdir(legacy_model):
+            os.makedirs(bundle.model_path)
+            for file_name in os.listdir(legacy_model):
+                if file_name.endswith(".lbph"):
+                    link_file(os.path.join(legacy_model, file_name),
+                              os.path.join(bundle.model_path, file_name))
+        elif os.path.exists(legacy_model):
+            link_file(legacy_model, bundle.model_path)
+        elif active_backend() == "numpy":
+            # Modelo monolítico previo a los shards por usuario
+            for name in ("recognizer.lbph", "recognizer.yml"):
+                monolithic = os.path.join(BUNDLE_DIR, name)
+                if os.path.exists(monolithic):
+                    split_into_shards(monolithic, label_map, bundle.model_path)
+                    break
+
+        if not os.path.exists(bundle.model_path):
+            discard_bundle(bundle)
+            return False
+        publish_bundle(bundle, labels, manifest["files"])
+        Logger.info(f"Modelo anterior migrado a la generación {bundle.generation}")
+        return True
+    except Exception as e:
+        discard_bundle(bundle)
+        Logger.error(f"Error migrando el modelo anterior: {str(e)}")
+        return False
@@ -0,0 +1,124 @@
+import os
+# Kivy no debe interpretar los argumentos de esta herramienta
+os.environ.setdefault("KIVY_NO_ARGS", "1")
+
+import time
+import argparse
+from kivy.logger import Logger
+from modules.camera.camera_utils import camera_manager
+from modules.camera.sources import create_source
+from modules.database.events import log_recognized, event_log
+from modules.face_recognition.detection import FaceDetector
+from modules.face_recognition.recognition import FaceRecognizer
+from modules.face_recognition.tracking import FaceTracker
+from modules.face_recognition.pipeline import MultiCameraPipeline
+from modules.utils.helpers import largest_faces
+
+# Mismo límite por frame que la pantalla de reconocimiento
+MAX_FACES_PER_FRAME = 5
+
+class _CameraRecognizer:
+    """Detector y tracker propios de una cámara; el reconocedor es compartido"""
+
+    def __init__(self, camera, recognizer):
+        self.camera = camera
+        self.detector = FaceDetector()
+        self.tracker = FaceTracker()
+        self.recognizer = recognizer
+
+    def process(self, frame, gray):
+        faces = largest_faces(self.detector.detect_fast(gray), MAX_FACES_PER_FRAME)
+        tracks = self.tracker.update(faces)
+        pending = [t for t in tracks if t.needs_recognition()]
+        if pending:
+            rois = [gray[y:y+h, x:x+w] for (x, y, w, h) in (t.box for t in pending)]
+            for track, (name, conf) in zip(pending, self.recognizer.predict_batch(rois)):
+                track.add_prediction(name, conf)
+            log_recognized(self.tracker.confirmed(tracks), self.camera)
+        known = [t.name for t in tracks if t.votes and t.name != "Desconocido"]
+        return frame, {"faces": len(tracks), "known": known}
+
+def parse_cameras(specs):
+    """
+    Convierte "nombre=fuente" (o solo "fuente") en {nombre: fuente}
+
+    La fuente es un índice de webcam, un video, una URL o una carpeta de imágenes.
+    """
+    cameras = {}
+    for i, spec in enumerate(specs):
+        name, _, source = spec.partition("=")
+        if not source:
+            name, source = f"cam{i + 1}", spec
+        cameras[name] = source
+    return cameras
+
+def format_stats(stats):
+    lines = [f"{'cámara':<12} {'fps':>6} {'latencia':>10} {'procesados':>11} {'perdidos':>9}"]
+    for camera, s in stats.items():
+        lines.append(f"{camera:<12} {s['fps']:>6.1f} {s['latency_ms']:>8.1f}ms "
+                     f"{s['processed']:>11} {s['dropped']:>9}")
+    return "\n".join(lines)
+
+def run_cameras(cameras, workers=None, seconds=30.0, realtime=True, report_every=5.0):
+    """
+    Reconoce rostros en varias cámaras a la vez con un pool compartido
+
+    Args:
+        cameras: {nombre: fuente}
+        workers: Hilos de detección/reconocimiento (por defecto, uno por CPU)
+        seconds: Duración de la prueba
+        realtime: Reproducir videos y carpetas al ritmo original
+        report_every: Segundos entre reportes de métricas
+
+    Returns:
+        dict: Métricas finales por cámara (ver MultiCameraPipeline.stats)
+    """
+    recognizer = FaceRecognizer()
+    recognizer.wait_until_loaded()
+    opened = []
+    for name, spec in cameras.items():
+        source = create_source(spec, realtime=realtime)
+        if camera_manager.open_camera(name=name, source=source):
+            opened.append(name)
+        else:
+            Logger.error(f"MultiCámara: no se pudo abrir {name} ({spec})")
+    if not opened:
+        return {}
+
+    per_camera = {name: _CameraRecognizer(name, recognizer) for name in opened}
+    pipeline = MultiCameraPipeline(lambda camera, frame, gray: per_camera[camera].process(frame, gray),
+                                   opened, workers)
+    pipeline.start()
+    start = last_report = time.monotonic()
+    try:
+        while time.monotonic() - start < seconds:
+            time.sleep(0.2)
+            if all(camera_manager.stream(name).source_finished for name in opened):
+                break
+            if time.monotonic() - last_report >= report_every:
+                last_report = time.monotonic()
+                print(format_stats(pipeline.stats()), flush=True)
+        return pipeline.stats()
+    finally:
+        pipeline.stop()
+        for name in opened:
+            camera_manager.release_camera(name)
+        event_log.flush()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Reconocimiento simultáneo en varias cámaras con métricas por cámara")
+    parser.add_argument("cameras", nargs="+", help="nombre=fuente (índice, video, URL o carpeta)")
+    parser.add_argument("--hilos", type=int, default=None,
+                        help="Hilos de trabajo compartidos (default: uno por CPU)")
+    parser.add_argument("--segundos", type=float, default=30.0, help="Duración (default: 30)")
+    parser.add_argument("--max", action="store_true",
+                        help="Reproducir videos y carpetas a máxima velocidad")
+    args = parser.parse_args(argv)
+
+    stats = run_cameras(parse_cameras(args.cameras), args.hilos, args.segundos, not args.max)
+    if stats:
+        print(format_stats(stats))
+
+if __name__ == "__main__":
+    main()
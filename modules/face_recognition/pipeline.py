@@ -0,0 +1,195 @@
+import os
+import threading
+import time
+from collections import deque, namedtuple
+import cv2
+from kivy.logger import Logger
+from modules.camera.camera_utils import camera_manager, DEFAULT_CAMERA
+from modules.utils.metrics import metrics
+
+# Resultado publicado por el pipeline: frame anotado y datos para la UI
+PipelineResult = namedtuple("PipelineResult", ["frame", "info", "seq", "timestamp"])
+
+# Ventana (segundos) para medir el rendimiento del pipeline
+THROUGHPUT_WINDOW = 2.0
+# Máximo de hilos de detección/reconocimiento compartidos entre cámaras
+MAX_WORKERS = 8
+
+class _CameraState:
+    """Último resultado y métricas de una cámara dentro del pipeline"""
+
+    def __init__(self, name):
+        self.name = name
+        self.result = None
+        self.last_seq = None
+        # Un frame por cámara a la vez: conserva el orden y el estado por cámara
+        self.busy = False
+        self.timings = deque()
+        self.processed = 0
+        self.latency_ms = 0.0
+
+    @property
+    def fps(self):
+        if len(self.timings) < 2:
+            return 0.0
+        elapsed = self.timings[-1] - self.timings[0]
+        return (len(self.timings) - 1) / elapsed if elapsed > 0 else 0.0
+
+    def reset(self):
+        self.result = None
+        self.last_seq = None
+        self.busy = False
+        self.timings.clear()
+
+class MultiCameraPipeline:
+    """
+    Pool acotado de hilos de detección/reconocimiento compartido por varias cámaras
+
+    process_frame(cámara, frame, gray) -> (frame_anotado, info) se ejecuta fuera
+    del hilo de Kivy. Los hilos toman las cámaras por turno rotativo, así una
+    cámara con muchos frames no acapara el pool, y nunca procesan dos frames de
+    la misma cámara a la vez (el estado por cámara, como el tracker, no necesita locks).
+    """
+
+    def __init__(self, process_frame, cameras, workers=None, name="multicámara"):
+        self.process_frame = process_frame
+        self.cameras = list(cameras)
+        self.name = name
+        self.workers = workers or min(len(self.cameras), os.cpu_count() or 1, MAX_WORKERS)
+        self._lock = threading.Lock()
+        self._threads = []
+        self._stop_event = threading.Event()
+        self._states = {camera: _CameraState(camera) for camera in self.cameras}
+        self._cursor = 0
+
+    def start(self):
+        """Inicia los hilos de trabajo si no están corriendo"""
+        if any(thread.is_alive() for thread in self._threads):
+            return
+        self._stop_event = threading.Event()
+        self._threads = [threading.Thread(target=self._run, args=(self._stop_event,), daemon=True)
+                         for _ in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+        Logger.info(f"Pipeline {self.name}: iniciado ({len(self.cameras)} cámaras, "
+                    f"{self.workers} hilos)")
+
+    def stop(self):
+        """Detiene los hilos de trabajo y descarta los últimos resultados"""
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+        self._threads = []
+        with self._lock:
+            for state in self._states.values():
+                state.reset()
+        Logger.info(f"Pipeline {self.name}: detenido")
+
+    def latest(self, camera=None, after_seq=None):
+        """Último resultado de una cámara, o None si no hay uno más nuevo que after_seq"""
+        with self._lock:
+            result = self._states[camera or self.cameras[0]].result
+        if result is None or (after_seq is not None and result.seq <= after_seq):
+            return None
+        return result
+
+    def stats(self):
+        """
+        Métricas por cámara
+
+        Returns:
+            dict: {cámara: {"fps", "latency_ms", "processed", "dropped"}}
+        """
+        with self._lock:
+            stats = {}
+            for camera, state in self._states.items():
+                stats[camera] = {
+                    "fps": state.fps,
+                    "latency_ms": state.latency_ms,
+                    "processed": state.processed,
+                    "dropped": camera_manager.stream(camera).dropped_frames,
+                }
+            return stats
+
+    def _next_job(self):
+        """Próxima cámara con frame nuevo y libre, por turno rotativo"""
+        with self._lock:
+            count = len(self.cameras)
+            for offset in range(count):
+                index = (self._cursor + offset) % count
+                state = self._states[self.cameras[index]]
+                if state.busy:
+                    continue
+                latest = camera_manager.read_latest(after_seq=state.last_seq, name=state.name)
+                if latest is None:
+                    continue
+                state.busy = True
+                state.last_seq = latest[1]
+                self._cursor = index + 1
+                return state, latest
+        return None
+
+    def _run(self, stop_event):
+        while not stop_event.is_set():
+            job = self._next_job()
+            if job is None:
+                # Sin frames nuevos todavía
+                time.sleep(0.005)
+                continue
+
+            state, (frame, seq, timestamp) = job
+            result = None
+            try:
+                with metrics.stage("gris"):
+                    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                with metrics.stage("procesamiento"):
+                    annotated, info = self.process_frame(state.name, frame, gray)
+                result = PipelineResult(annotated, info, seq, timestamp)
+            except Exception as e:
+                Logger.error(f"Pipeline {self.name}: error procesando frame de {state.name}: {str(e)}")
+
+            now = time.monotonic()
+            if result is not None:
+                metrics.tick("pipeline")
+                metrics.record("latencia_pipeline", 1000.0 * (now - timestamp))
+            with self._lock:
+                state.busy = False
+                if result is None or stop_event.is_set():
+                    continue
+                state.result = result
+                state.processed += 1
+                state.latency_ms = 1000.0 * (now - timestamp)
+                state.timings.append(now)
+                while state.timings and now - state.timings[0] > THROUGHPUT_WINDOW:
+                    state.timings.popleft()
+
+class VisionPipeline(MultiCameraPipeline):
+    """
+    Captura → gris → procesamiento (detección/reconocimiento) en un hilo de trabajo
+
+    La pantalla aporta process_frame(frame, gray) -> (frame_anotado, info), que se
+    ejecuta fuera del hilo de Kivy y no debe tocar widgets. La UI solo toma el
+    último resultado con latest() y sube el frame a la textura.
+    """
+
+    def __init__(self, process_frame, name="pipeline", camera=DEFAULT_CAMERA):
+        super().__init__(lambda _camera, frame, gray: process_frame(frame, gray),
+                         [camera], workers=1, name=name)
+
+    @property
+    def _state(self):
+        return self._states[self.cameras[0]]
+
+    @property
+    def fps(self):
+        """Frames procesados por segundo en la ventana reciente"""
+        with self._lock:
+            return self._state.fps
+
+    @property
+    def processed(self):
+        return self._state.processed
+
+    @property
+    def latency_ms(self):
+        return self._state.latency_ms
@@ -2,11 +2,34 @@ import os
 import cv2
 import threading
 import time
+from collections import namedtuple
+from contextlib import nullcontext
 from kivy.logger import Logger
 from kivy.clock import Clock
 from threading import Lock
+from modules.face_recognition.lbph import create_recognizer
+from modules.face_recognition.model_store import (
+    current_bundle, current_generation, read_label_map, migrate_legacy_model,
+    pin_generation, unpin_generation
+)
+from modules.face_recognition.result_cache import RecognitionCache, roi_hash
+
+# Segundos entre comprobaciones de una generación nueva publicada en disco
+GENERATION_POLL_INTERVAL = 5.0
+# Reutilizar resultados de recortes casi idénticos (ver result_cache.py)
+USE_RESULT_CACHE = True
+
+# Estado inmutable del modelo: se reemplaza entero con una sola asignación
+ModelSnapshot = namedtuple("ModelSnapshot", ["recognizer", "label_map", "generation", "path"])
 
 class FaceRecognizer:
+    """
+    Reconocedor global de solo lectura en el camino caliente
+
+    predict() no toma ningún lock compartido: lee el snapshot vigente y, si el
+    motor no es thread_safe (cv2.face), usa una instancia propia del hilo.
+    _lock solo protege la creación del singleton y _swap_lock el reemplazo del snapshot.
+    """
     _instance = None
     _lock = Lock()
     
@@ -18,78 +41,226 @@ class FaceRecognizer:
         return cls._instance
 
     def _initialize(self):
-        self.recognizer = cv2.face.LBPHFaceRecognizer_create()
-        self.label_map = {}
-        self.is_trained = False
+        self._snapshot = None
+        self._swap_lock = Lock()
+        # Instancias por hilo para motores que no admiten predicciones concurrentes
+        self._local = threading.local()
+        self._fallback_lock = Lock()
+        self.cache = RecognitionCache() if USE_RESULT_CACHE else None
         self.is_loading = False
-        self.model_path = "modelos/global/recognizer.yml"
-        self.label_map_path = "modelos/global/label_map.txt"
+        # Marcado cuando no hay ninguna carga en segundo plano en curso
+        self._load_done = threading.Event()
+        self._load_done.set()
         
-        # Carga inicial en segundo plano
+        # Carga inicial en segundo plano y vigilancia de nuevas generaciones
         self._start_async_load()
+        Clock.schedule_interval(lambda dt: self._check_generation(), GENERATION_POLL_INTERVAL)
+
+    @property
+    def is_trained(self):
+        return self._snapshot is not None
+
+    @property
+    def generation(self):
+        snapshot = self._snapshot
+        return snapshot.generation if snapshot else 0
+
+    @property
+    def recognizer(self):
+        snapshot = self._snapshot
+        return snapshot.recognizer if snapshot else None
+
+    @property
+    def loaded_model(self):
+        """(reconocedor, generación) del snapshot vigente, leídos juntos; None sin modelo"""
+        snapshot = self._snapshot
+        return (snapshot.recognizer, snapshot.generation) if snapshot else None
+
+    @property
+    def label_map(self):
+        snapshot = self._snapshot
+        return snapshot.label_map if snapshot else {}
+
+    def load_model(self):
+        """
+        Carga en el hilo actual la generación publicada si es más nueva que la vigente
+
+        Returns:
+            bool: True si hay un modelo listo para predecir
+        """
+        try:
+            # Publicar una sola vez como generación un modelo del formato anterior
+            migrate_legacy_model()
+            bundle = current_bundle()
+            
+            if bundle is not None and os.path.exists(bundle.model_path):
+                if bundle.generation > self.generation:
+                    # Cargar en un reconocedor temporal
+                    temp_recognizer = create_recognizer()
+                    temp_recognizer.read(bundle.model_path)
+                    temp_label_map = read_label_map(bundle)
+                    
+                    if self._publish(ModelSnapshot(temp_recognizer, temp_label_map,
+                                                   bundle.generation, bundle.model_path)):
+                        Logger.info(f"✅ Modelo cargado correctamente (generación {bundle.generation})")
+            else:
+                Logger.warning("Archivos del modelo no encontrados")
+        except Exception as e:
+            Logger.error(f"Error cargando modelo: {str(e)}")
+        return self.is_trained
+
+    def wait_until_loaded(self, timeout=None):
+        """
+        Espera a que termine la carga en segundo plano en curso, sin leer el modelo otra vez
+
+        Returns:
+            bool: True si hay un modelo listo para predecir
+        """
+        self._load_done.wait(timeout)
+        return self.is_trained
 
     def _start_async_load(self):
-        """Inicia la carga del modelo en segundo plano"""
+        """Inicia la carga de la generación publicada en segundo plano"""
         if self.is_loading:
             return
             
         self.is_loading = True
+        self._load_done.clear()
         Logger.info("Iniciando carga asíncrona del modelo...")
         
         def load_task():
             try:
-                if os.path.exists(self.model_path) and os.path.exists(self.label_map_path):
-                    # Cargar en un reconocedor temporal
-                    temp_recognizer = cv2.face.LBPHFaceRecognizer_create()
-                    temp_recognizer.read(self.model_path)
-                    
-                    # Cargar etiquetas
-                    temp_label_map = {}
-                    with open(self.label_map_path, "r", encoding="utf-8") as f:
-                        for line in f:
-                            id_s, name = line.strip().split(",", 1)
-                            temp_label_map[int(id_s)] = name
-                    
-                    # Actualizar en el hilo principal
-                    def update_ui():
-                        with self._lock:
-                            self.recognizer = temp_recognizer
-                            self.label_map = temp_label_map
-                            self.is_trained = True
-                            self.is_loading = False
-                        Logger.info("✅ Modelo cargado correctamente")
-                    
-                    Clock.schedule_once(lambda dt: update_ui())
-                else:
-                    Logger.warning("Archivos del modelo no encontrados")
-                    self.is_loading = False
-            except Exception as e:
-                Logger.error(f"Error cargando modelo: {str(e)}")
+                self.load_model()
+            finally:
                 self.is_loading = False
+                self._load_done.set()
 
         # Ejecutar en un hilo separado
         threading.Thread(target=load_task, daemon=True).start()
 
+    def _check_generation(self):
+        """Carga en segundo plano una generación publicada más nueva que la actual"""
+        if not self.is_loading and current_generation() > self.generation:
+            self._start_async_load()
+
+    def _publish(self, snapshot):
+        """
+        Instala un snapshot con una sola asignación de referencia
+
+        La generación de un snapshot con path queda fijada en disco mientras sea
+        la vigente: los hilos cargan de ahí su copia del modelo cv2.face.
+
+        Returns:
+            bool: False si ya hay una generación más nueva
+        """
+        with self._swap_lock:
+            current = self._snapshot
+            if current is not None and snapshot.generation < current.generation:
+                return False
+            if snapshot.path is not None:
+                pin_generation(snapshot.generation)
+            self._snapshot = snapshot
+        if current is not None and current.path is not None:
+            unpin_generation(current.generation)
+        return True
+
+    def swap_model(self, recognizer, label_map, generation=None):
+        """Reemplaza modelo y etiquetas juntos, sin pasar por el disco"""
+        generation = current_generation() if generation is None else generation
+        bundle = current_bundle()
+        path = bundle.model_path if bundle is not None and bundle.generation == generation else None
+        if self._publish(ModelSnapshot(recognizer, dict(label_map), generation, path)):
+            Logger.info(f"✅ Modelo actualizado en memoria (generación {generation})")
+
     def reload_model(self):
         """Recarga el modelo en segundo plano"""
         if not self.is_loading:
             self._start_async_load()
         return True
 
-    def predict(self, face_image):
-        """Predicción segura con verificación de carga"""
-        with self._lock:
-            if not self.is_trained:
-                return "Modelo cargando...", None
-                
+    def _prepare(self, face_image):
+        """Convierte a gris y normaliza a 200x200 como en el entrenamiento"""
+        gray = face_image if len(face_image.shape) == 2 else \
+               cv2.cvtColor(face_image, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray, (200, 200))
+
+    def _thread_recognizer(self, snapshot):
+        """
+        Reconocedor que el hilo actual puede usar con este snapshot
+
+        Returns:
+            tuple: (reconocedor, lock o None si no hace falta serializar)
+        """
+        recognizer = snapshot.recognizer
+        if getattr(recognizer, "thread_safe", False):
+            return recognizer, None
+        if snapshot.path is None:
+            # Sin archivo publicado del cual cargar una copia: se serializa
+            return recognizer, self._fallback_lock
+
+        local = self._local
+        if getattr(local, "snapshot", None) is not snapshot:
+            local.recognizer, local.snapshot = None, snapshot
             try:
-                gray = face_image if len(face_image.shape) == 2 else \
-                       cv2.cvtColor(face_image, cv2.COLOR_BGR2GRAY)
-                gray = cv2.resize(gray, (200, 200))
-                
-                label_id, confidence = self.recognizer.predict(gray)
-                name = self.label_map.get(label_id, "Desconocido")
-                return name, (100 - confidence) if confidence <= 100 else 0
+                copy = create_recognizer()
+                copy.read(snapshot.path)
+                local.recognizer = copy
             except Exception as e:
-                Logger.error(f"Error en predicción: {str(e)}")
-                return "Error", None
\ No newline at end of file
+                Logger.warning(f"No se pudo cargar la copia del modelo del hilo: {str(e)}")
+        if local.recognizer is None:
+            # Generación borrada por otro proceso: se serializa el modelo del snapshot
+            return recognizer, self._fallback_lock
+        return local.recognizer, None
+
+    def _to_result(self, label_map, label_id, confidence):
+        name = label_map.get(int(label_id), "Desconocido")
+        return name, (100 - confidence) if confidence <= 100 else 0
+
+    def predict(self, face_image):
+        """Predicción segura con verificación de carga"""
+        return self.predict_batch([face_image])[0]
+
+    def predict_batch(self, face_images):
+        """
+        Identifica varios rostros en una sola pasada sobre la galería
+
+        Los rostros con un resultado reciente en el caché no se comparan otra vez.
+
+        Returns:
+            list: (nombre, confianza) por cada rostro, en el mismo orden
+        """
+        if not face_images:
+            return []
+        # Un solo snapshot por llamada: modelo y etiquetas siempre de la misma generación
+        snapshot = self._snapshot
+        if snapshot is None:
+            return [("Modelo cargando...", None)] * len(face_images)
+
+        try:
+            batch = [self._prepare(face) for face in face_images]
+            results = [None] * len(batch)
+            hashes = [None] * len(batch)
+            if self.cache is not None:
+                for i, face in enumerate(batch):
+                    hashes[i] = roi_hash(face)
+                    results[i] = self.cache.get(hashes[i], snapshot.generation)
+            pending = [i for i, result in enumerate(results) if result is None]
+            if not pending:
+                return results
+
+            recognizer, lock = self._thread_recognizer(snapshot)
+            with lock or nullcontext():
+                if hasattr(recognizer, "predict_batch"):
+                    label_ids, confidences = recognizer.predict_batch([batch[i] for i in pending])
+                else:
+                    # cv2.face no tiene predicción por lotes
+                    label_ids, confidences = zip(*(recognizer.predict(batch[i]) for i in pending))
+
+            for i, label_id, confidence in zip(pending, label_ids, confidences):
+                results[i] = self._to_result(snapshot.label_map, label_id, float(confidence))
+                if self.cache is not None:
+                    self.cache.put(hashes[i], snapshot.generation, results[i])
+            return results
+        except Exception as e:
+            Logger.error(f"Error en predicción: {str(e)}")
+            return [("Error", None)] * len(face_images)
@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import OrderedDict
+import cv2
+import numpy as np
+
+# Resultados recordados, antigüedad máxima (segundos) y bits distintos tolerados
+RESULT_CACHE_SIZE = 128
+RESULT_CACHE_TTL = 2.0
+RESULT_CACHE_TOLERANCE = 4
+# Lado de la imagen reducida sobre la que se calcula la DCT
+HASH_SIZE = 32
+
+def roi_hash(gray_face):
+    """
+    Hash perceptual DCT de 64 bits de un rostro en gris
+
+    Los 8x8 coeficientes de menor frecuencia se comparan contra su mediana;
+    recortes casi iguales del mismo rostro difieren en pocos bits.
+
+    Returns:
+        int: Hash de 64 bits
+    """
+    small = cv2.resize(gray_face, (HASH_SIZE, HASH_SIZE), interpolation=cv2.INTER_AREA)
+    low = cv2.dct(np.float32(small))[:8, :8].ravel()
+    # El coeficiente DC solo refleja el brillo medio
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+class RecognitionCache:
+    """
+    Caché LRU de resultados de predicción por hash del ROI y generación del modelo
+
+    Un rostro quieto frente a la cámara produce recortes casi idénticos; si el
+    hash está a max_distance bits o menos de uno reciente, se reutiliza su
+    resultado sin recorrer la galería.
+    """
+
+    def __init__(self, capacity=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL,
+                 max_distance=RESULT_CACHE_TOLERANCE):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, face_hash, generation):
+        """
+        Resultado guardado para un hash parecido de la misma generación
+
+        Returns:
+            tuple: (nombre, confianza) o None si no hay uno vigente
+        """
+        now = time.monotonic()
+        with self._lock:
+            key = (generation, face_hash)
+            entry = self._entries.get(key)
+            if entry is None and self.max_distance > 0:
+                for candidate, value in reversed(self._entries.items()):
+                    if candidate[0] == generation and \
+                            hamming(candidate[1], face_hash) <= self.max_distance:
+                        key, entry = candidate, value
+                        break
+
+            if entry is not None and now - entry[1] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, face_hash, generation, result):
+        """Guarda un resultado y descarta el menos usado si se excede la capacidad"""
+        with self._lock:
+            self._entries[(generation, face_hash)] = (result, time.monotonic())
+            self._entries.move_to_end((generation, face_hash))
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Aciertos, fallos y tasa de aciertos desde el inicio"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size": len(self._entries),
+            }
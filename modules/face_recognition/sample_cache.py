@@ -0,0 +1,124 @@
+import os
+import cv2
+import json
+import numpy as np
+from kivy.logger import Logger
+from modules.utils.photo_store import photo_key, read_photo
+
+CACHE_DIR = os.path.join("modelos", "cache")
+FACE_SIZE = (200, 200)
+
+def _cache_paths(user_name):
+    """Rutas del arreglo de muestras y su índice para un usuario"""
+    return (os.path.join(CACHE_DIR, f"{user_name}.npy"),
+            os.path.join(CACHE_DIR, f"{user_name}.json"))
+
+def _read_cache(user_name):
+    """
+    Carga el caché de un usuario
+
+    Returns:
+        tuple: (arreglo N x 200 x 200, {foto: (fila, clave)}) o (None, {})
+    """
+    array_path, index_path = _cache_paths(user_name)
+    if not os.path.exists(array_path) or not os.path.exists(index_path):
+        return None, {}
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        # Lectura completa en bloque: un mmap abierto impediría reemplazar el archivo en Windows
+        samples = np.load(array_path)
+        # El índice se escribe después del arreglo; si no coinciden, el caché quedó a medias
+        if samples.shape[0] != len(entries) or samples.shape[1:] != FACE_SIZE:
+            return None, {}
+        return samples, {photo: (row, key) for row, (photo, key) in enumerate(entries)}
+    except Exception as e:
+        Logger.warning(f"Caché de muestras inválido para {user_name}: {str(e)}")
+        return None, {}
+
+def _write_cache(user_name, samples, entries):
+    """Guarda arreglo e índice reemplazándolos atómicamente"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    array_path, index_path = _cache_paths(user_name)
+    temp_array = f"{array_path}.tmp"
+    with open(temp_array, "wb") as f:
+        np.save(f, samples)
+    os.replace(temp_array, array_path)
+
+    temp_index = f"{index_path}.tmp"
+    with open(temp_index, "w", encoding="utf-8") as f:
+        json.dump(entries, f, ensure_ascii=False)
+    os.replace(temp_index, index_path)
+
+def load_user_samples(user_name, photos, base_dir="data", prune=False):
+    """
+    Devuelve las muestras en gris 200x200 de las fotos indicadas
+
+    Solo decodifica las fotos nuevas o modificadas (según photo_key); el
+    resto se lee en bloque del caché y este se actualiza si hubo cambios.
+
+    Args:
+        user_name: Nombre del usuario
+        photos: Nombres de archivo dentro de data/<usuario> (o ubicaciones en su pack)
+        base_dir: Directorio base (default: "data")
+        prune: Quitar del caché las fotos que no se pidieron
+
+    Returns:
+        tuple: (arreglo N x 200 x 200 uint8, [fotos incluidas])
+    """
+    cached, index = _read_cache(user_name)
+    rows, entries, loaded = [], [], []
+    changed = False
+
+    for photo in photos:
+        path = os.path.join(base_dir, user_name, photo)
+        try:
+            key = photo_key(path)
+        except OSError:
+            continue
+
+        hit = index.get(photo)
+        if hit is not None and hit[1] == key:
+            sample = cached[hit[0]]
+        else:
+            img = read_photo(path, cv2.IMREAD_GRAYSCALE)
+            if img is None:
+                continue
+            sample = cv2.resize(img, FACE_SIZE)
+            changed = True
+
+        rows.append(sample)
+        entries.append([photo, key])
+        loaded.append(photo)
+
+    samples = np.stack(rows) if rows else np.empty((0,) + FACE_SIZE, dtype=np.uint8)
+
+    # Conservar las entradas que no se pidieron, salvo que se pida depurar
+    requested = set(loaded)
+    kept = [(photo, row, key) for photo, (row, key) in index.items() if photo not in requested]
+    if prune and kept:
+        kept = []
+        changed = True
+
+    if changed:
+        try:
+            all_rows = [cached[row] for _, row, _ in kept] + rows
+            all_entries = [[photo, key] for photo, _, key in kept] + entries
+            stacked = np.stack(all_rows) if all_rows else samples
+            _write_cache(user_name, stacked, all_entries)
+        except Exception as e:
+            Logger.warning(f"No se pudo actualizar el caché de {user_name}: {str(e)}")
+    return samples, loaded
+
+def purge_cache(valid_users):
+    """Elimina el caché de usuarios que ya no existen"""
+    if not os.path.exists(CACHE_DIR):
+        return
+    valid = set(valid_users)
+    for file_name in os.listdir(CACHE_DIR):
+        user_name, ext = os.path.splitext(file_name)
+        if ext in (".npy", ".json") and user_name not in valid:
+            try:
+                os.remove(os.path.join(CACHE_DIR, file_name))
+            except OSError as e:
+                Logger.warning(f"No se pudo eliminar {file_name}: {str(e)}")
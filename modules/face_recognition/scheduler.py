@@ -0,0 +1,128 @@
+import threading
+import time
+from kivy.clock import Clock
+from kivy.logger import Logger
+from modules.face_recognition.recognition import FaceRecognizer
+from modules.face_recognition.training import build_model, TrainingCancelled
+
+# Segundos de espera tras la última solicitud antes de entrenar:
+# varias capturas seguidas producen un solo entrenamiento
+COALESCE_DELAY = 1.5
+
+class TrainingScheduler:
+    """Cola de entrenamiento en un hilo de trabajo con agrupación de solicitudes"""
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
+                cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        self._condition = threading.Condition()
+        self._pending = False
+        self._full_rebuild = False
+        self._deadline = 0.0
+        self._callbacks = []
+        self._cancel_event = threading.Event()
+        self._thread = None
+        self.is_running = False
+        self.progress = 0.0
+
+    def request_training(self, full_rebuild=False, on_progress=None, on_done=None):
+        """
+        Solicita un entrenamiento en segundo plano
+
+        Las solicitudes que llegan dentro de COALESCE_DELAY se agrupan en un solo
+        trabajo; si ya hay uno en curso, se programa otro al terminar.
+
+        Args:
+            full_rebuild: Forzar reentrenamiento completo
+            on_progress: Función opcional (fracción, mensaje), llamada en el hilo de Kivy
+            on_done: Función opcional (éxito, cancelado), llamada en el hilo de Kivy
+        """
+        with self._condition:
+            self._pending = True
+            self._full_rebuild = self._full_rebuild or full_rebuild
+            self._deadline = time.time() + COALESCE_DELAY
+            self._callbacks.append((on_progress, on_done))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def cancel(self):
+        """Cancela el trabajo en curso y descarta las solicitudes pendientes"""
+        with self._condition:
+            callbacks = self._callbacks
+            self._callbacks = []
+            self._pending = False
+            self._full_rebuild = False
+            self._cancel_event.set()
+            self._condition.notify()
+        for _, on_done in callbacks:
+            self._dispatch(on_done, False, True)
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                while True:
+                    if not self._pending:
+                        self._condition.wait()
+                        continue
+                    remaining = self._deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+
+                full_rebuild = self._full_rebuild
+                callbacks = self._callbacks
+                self._pending = False
+                self._full_rebuild = False
+                self._callbacks = []
+                self._cancel_event.clear()
+                self.is_running = True
+                self.progress = 0.0
+
+            self._run_job(full_rebuild, callbacks)
+
+            with self._condition:
+                self.is_running = False
+
+    def _run_job(self, full_rebuild, callbacks):
+        """Ejecuta un entrenamiento y publica el modelo resultante"""
+        def report(fraction, message):
+            self.progress = fraction
+            for on_progress, _ in callbacks:
+                self._dispatch(on_progress, fraction, message)
+
+        success, cancelled = False, False
+        try:
+            # La galería en memoria se reutiliza: solo se cargan los shards que cambian
+            result = build_model(full_rebuild, report, self._cancel_event,
+                                 FaceRecognizer().loaded_model)
+            if result is not None:
+                recognizer, label_map, generation = result
+                if recognizer is not None:
+                    FaceRecognizer().swap_model(recognizer, label_map, generation)
+                success = True
+        except TrainingCancelled:
+            Logger.info("Entrenamiento cancelado")
+            cancelled = True
+        except Exception as e:
+            Logger.error(f"Error en trabajo de entrenamiento: {str(e)}")
+
+        for _, on_done in callbacks:
+            self._dispatch(on_done, success, cancelled)
+
+    @staticmethod
+    def _dispatch(callback, *args):
+        """Ejecuta un callback de la UI en el hilo principal de Kivy"""
+        if callback is not None:
+            Clock.schedule_once(lambda dt: callback(*args))
+
+# Instancia global del planificador de entrenamiento
+training_scheduler = TrainingScheduler()
@@ -0,0 +1,165 @@
+from collections import deque, defaultdict, namedtuple
+
+# Frames entre re-reconocimientos de un rostro ya identificado
+RECOGNIZE_EVERY = 10
+# Por debajo de esta confianza se reconoce en cada frame hasta estabilizar
+MIN_CONFIDENCE = 40.0
+# Predicciones recientes que participan en la votación
+VOTE_WINDOW = 7
+# Votos con los que un rostro de confianza baja (un desconocido) se da por
+# estabilizado y pasa a refrescarse cada RECOGNIZE_EVERY frames
+SETTLED_VOTES = VOTE_WINDOW // 2 + 1
+# Etiqueta de las predicciones que no corresponden a ningún usuario
+UNKNOWN_NAME = "Desconocido"
+# Frames sin detección antes de descartar un track
+MAX_MISSED = 5
+# Solapamiento mínimo para asociar una detección con un track
+IOU_THRESHOLD = 0.3
+
+# Rostro seguido cuyo nombre votado acaba de confirmarse (ver FaceTracker.confirmed)
+ConfirmedFace = namedtuple("ConfirmedFace", ["user_name", "confidence", "track_id"])
+
+def iou(a, b):
+    """Intersección sobre unión de dos rectángulos (x, y, w, h)"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+class Track:
+    """Rostro seguido entre frames con su historial de predicciones"""
+
+    def __init__(self, track_id, box):
+        self.track_id = track_id
+        self.box = box
+        self.missed = 0
+        self.frames_since_recognition = None
+        self.votes = deque(maxlen=VOTE_WINDOW)
+        # Último nombre confirmado para este rostro
+        self.confirmed_name = None
+
+    def needs_recognition(self, every=RECOGNIZE_EVERY, min_confidence=MIN_CONFIDENCE):
+        """
+        True si nunca se reconoció, si tocó refrescar o si la confianza es baja
+
+        La confianza baja solo fuerza reconocer en cada frame hasta que la
+        etiqueta votada reúne SETTLED_VOTES votos: un rostro que no está
+        registrado se refresca después al intervalo normal.
+        """
+        if self.frames_since_recognition is None or not self.votes:
+            return True
+        if self.frames_since_recognition >= every:
+            return True
+        return self.confidence < min_confidence and self.vote_count < SETTLED_VOTES
+
+    def add_prediction(self, name, confidence):
+        """Registra una predicción; las de modelo cargando/error no votan"""
+        self.frames_since_recognition = 0
+        if confidence is not None:
+            self.votes.append((name, confidence))
+
+    def confirm(self):
+        """
+        Confirma el nombre votado si es un usuario con SETTLED_VOTES votos
+        distinto del último confirmado
+
+        Returns:
+            ConfirmedFace o None si no hay nada nuevo que confirmar
+        """
+        name = self.name
+        if name in (UNKNOWN_NAME, self.confirmed_name) or self.vote_count < SETTLED_VOTES:
+            return None
+        self.confirmed_name = name
+        return ConfirmedFace(name, self.confidence, self.track_id)
+
+    @property
+    def name(self):
+        """Etiqueta con mayor confianza acumulada en la ventana de votación"""
+        if not self.votes:
+            return "Reconociendo..."
+        scores = defaultdict(float)
+        for name, confidence in self.votes:
+            scores[name] += max(confidence, 1.0)
+        return max(scores, key=scores.get)
+
+    @property
+    def vote_count(self):
+        """Votos de la ventana que coinciden con la etiqueta votada"""
+        name = self.name
+        return sum(1 for n, _ in self.votes if n == name)
+
+    @property
+    def confidence(self):
+        """Confianza media de las predicciones que coinciden con la etiqueta votada"""
+        name = self.name
+        matches = [confidence for n, confidence in self.votes if n == name]
+        return sum(matches) / len(matches) if matches else 0.0
+
+class FaceTracker:
+    """Asocia detecciones entre frames por IoU y asigna un ID a cada rostro"""
+
+    def __init__(self, iou_threshold=IOU_THRESHOLD, max_missed=MAX_MISSED):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.tracks = []
+        self._next_id = 1
+
+    def update(self, faces):
+        """
+        Actualiza los tracks con las detecciones del frame actual
+
+        Args:
+            faces: Lista de rectángulos (x, y, w, h)
+
+        Returns:
+            list: Tracks visibles en este frame, en el orden de faces
+        """
+        pairs = sorted(((iou(track.box, face), t, f)
+                        for t, track in enumerate(self.tracks)
+                        for f, face in enumerate(faces)), reverse=True)
+        assigned, used_tracks = {}, set()
+        for overlap, t, f in pairs:
+            if overlap < self.iou_threshold:
+                break
+            if t in used_tracks or f in assigned:
+                continue
+            assigned[f] = self.tracks[t]
+            used_tracks.add(t)
+
+        for t, track in enumerate(self.tracks):
+            if t not in used_tracks:
+                track.missed += 1
+
+        visible = []
+        for f, face in enumerate(faces):
+            track = assigned.get(f)
+            if track is None:
+                track = Track(self._next_id, face)
+                self._next_id += 1
+                self.tracks.append(track)
+            else:
+                track.box = face
+                track.missed = 0
+                if track.frames_since_recognition is not None:
+                    track.frames_since_recognition += 1
+            visible.append(track)
+
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+        return visible
+
+    def confirmed(self, tracks):
+        """
+        Rostros de tracks cuyo nombre votado se confirma en este frame: la
+        primera vez que es un usuario con mayoría de votos y cada vez que cambia
+
+        Returns:
+            list: ConfirmedFace, listos para registrar tal cual
+        """
+        return [face for face in (track.confirm() for track in tracks) if face is not None]
+
+    def reset(self):
+        """Olvida todos los rostros seguidos"""
+        self.tracks = []
@@ -1,80 +1,381 @@
 import os
-import cv2
 import time  # Importación añadida
 import numpy as np
-from modules.database.operations import list_users, init_db
+from modules.database.operations import list_users, list_photos, init_db
+from modules.face_recognition.lbph import (
+    create_recognizer, active_backend, NumpyLBPHRecognizer, ShardedLBPHRecognizer,
+    write_shard, shard_path, read_gallery_index, write_gallery_index, write_gallery,
+    GALLERY_NAME
+)
+from modules.face_recognition.model_store import (
+    current_bundle, create_bundle, publish_bundle, discard_bundle, link_file,
+    read_manifest, migrate_legacy_model
+)
+from modules.face_recognition.sample_cache import load_user_samples, purge_cache
+from modules.utils.photo_store import photo_key
 from kivy.logger import Logger
 
 MODEL_DIR = "modelos"
-GLOBAL_MODEL_PATH = os.path.join(MODEL_DIR, "global", "recognizer.yml")
-LABEL_MAP_FILE = os.path.join(MODEL_DIR, "global", "label_map.txt")
+
+# Limitar tamaño de imágenes para entrenamiento
+MAX_IMAGES_PER_USER = 50
+
+class TrainingCancelled(Exception):
+    """El entrenamiento fue cancelado antes de guardar el modelo"""
 
 def ensure_model_dir():
     """Crea la estructura de directorios para los modelos si no existe"""
     os.makedirs(os.path.join(MODEL_DIR, "global"), exist_ok=True)
 
-def train_model():
-    """Entrenamiento optimizado"""
+def _photo_sort_key(file_name):
+    """Ordena 2.jpg antes que 10.jpg para que el recorte a MAX_IMAGES_PER_USER sea estable"""
+    stem = os.path.splitext(file_name)[0]
+    return (0, int(stem), file_name) if stem.isdigit() else (1, 0, file_name)
+
+def _list_training_photos(user_name):
+    """Devuelve los nombres de archivo de fotos catalogadas de un usuario, ordenados"""
+    photos = [os.path.basename(row[0]) for row in list_photos(user_name)]
+    return sorted(photos, key=_photo_sort_key)
+
+def _photo_versions(user_name, photos, base_dir="data"):
+    """
+    Fotos pedidas con su photo_key (mtime y tamaño), omitiendo las que ya no existen
+
+    Se compara contra la lista pedida y no contra las fotos decodificadas: una
+    foto ilegible no debe forzar la reconstrucción del shard en cada pasada.
+    """
+    versions = []
+    for photo in photos:
+        try:
+            versions.append([photo, photo_key(os.path.join(base_dir, user_name, photo))])
+        except OSError:
+            continue
+    return versions
+
+def _save_model(recognizer, labels, files, samples):
+    """
+    Publica modelo, mapa de etiquetas y manifiesto como una nueva generación
+
+    Returns:
+        int: Generación publicada
+    """
+    bundle = create_bundle()
     try:
-        start_time = time.time()
-        Logger.info("Iniciando entrenamiento...")
-        
-        # Colectar datos
-        faces, labels, label_map = [], [], {}
-        label_id = 0
-        
-        # Limitar tamaño de imágenes para entrenamiento
-        MAX_IMAGES_PER_USER = 50  
-        
-        for user_id, user_name, _, _ in list_users():
-            user_dir = os.path.join("data", user_name)
-            if not os.path.exists(user_dir):
-                continue
-                
-            photos = [f for f in os.listdir(user_dir) 
-                     if f.lower().endswith(('.png', '.jpg', '.jpeg'))][:MAX_IMAGES_PER_USER]
-            
-            if not photos:
-                continue
-                
-            label_map[label_id] = user_name
-            
-            for photo in photos:
-                img_path = os.path.join(user_dir, photo)
-                img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
-                if img is not None:
-                    img = cv2.resize(img, (200, 200))
-                    faces.append(img)
-                    labels.append(label_id)
-            
-            label_id += 1
-
-        if len(faces) < 2:
-            Logger.error("Insuficientes imágenes para entrenar")
-            return False
-
-        # Entrenamiento con progreso
-        recognizer = cv2.face.LBPHFaceRecognizer_create()
-        Logger.info(f"Entrenando con {len(faces)} imágenes...")
-        recognizer.train(faces, np.array(labels))
-        
-        # Guardar modelo temporal
-        temp_path = f"{GLOBAL_MODEL_PATH}.tmp"
-        recognizer.save(temp_path)
-        
-        # Reemplazar atómicamente
-        import shutil
-        shutil.move(temp_path, GLOBAL_MODEL_PATH)
-        
-        # Guardar etiquetas
-        with open(LABEL_MAP_FILE, "w", encoding="utf-8") as f:
-            for id_, name in label_map.items():
-                f.write(f"{id_},{name}\n")
-        
-        Logger.info(f"Entrenamiento completado en {time.time()-start_time:.2f}s")
-        return True
-        
+        recognizer.save(bundle.model_path)
+        return publish_bundle(bundle, labels, files, samples)
+    except Exception:
+        discard_bundle(bundle)
+        raise
+
+def train_model(full_rebuild=False, progress_callback=None, cancel_event=None):
+    """
+    Entrena el modelo de reconocimiento
+
+    Con el motor NumPy solo se reconstruyen los shards de usuarios nuevos,
+    modificados o eliminados. Con el motor OpenCV se agregan al modelo existente
+    solo las fotos nuevas (LBPH update()) y se reconstruye desde cero si se pide
+    explícitamente, si no hay modelo previo o si se eliminaron usuarios o fotos.
+
+    Args:
+        full_rebuild: Forzar reentrenamiento completo
+        progress_callback: Función opcional (fracción, mensaje)
+        cancel_event: threading.Event opcional para cancelar
+
+    Returns:
+        bool: True si el modelo quedó actualizado
+    """
+    try:
+        return build_model(full_rebuild, progress_callback, cancel_event) is not None
+    except TrainingCancelled:
+        Logger.info("Entrenamiento cancelado")
+        return False
+
+def build_model(full_rebuild=False, progress_callback=None, cancel_event=None, loaded=None):
+    """
+    Entrena, guarda y devuelve el modelo para poder usarlo sin releerlo del disco
+
+    Args:
+        loaded: (reconocedor, generación) que ya está en memoria; con el motor
+                NumPy la galería nueva se arma a partir de él y de los shards
+                reconstruidos, sin volver a mapear los demás
+
+    Returns:
+        tuple: (reconocedor, {id: nombre}, generación); reconocedor es None si no
+               hubo cambios. None si el entrenamiento falló
+
+    Raises:
+        TrainingCancelled: Si cancel_event se activó antes de guardar
+    """
+    try:
+        ensure_model_dir()
+        migrate_legacy_model()
+        bundle = current_bundle()
+        if active_backend() == "numpy":
+            return _train_shards(bundle, full_rebuild, progress_callback, cancel_event, loaded)
+        if not full_rebuild:
+            manifest = read_manifest(bundle)
+            if manifest is not None and os.path.exists(bundle.model_path):
+                result = _train_incremental(bundle, manifest, progress_callback, cancel_event)
+                if result is not None:
+                    return result
+        return _train_full(bundle, progress_callback, cancel_event)
+    except TrainingCancelled:
+        raise
     except Exception as e:
         Logger.error(f"Error en entrenamiento: {str(e)}")
-        return False
-   
\ No newline at end of file
+        return None
+
+def _report(progress_callback, cancel_event, fraction, message):
+    """Notifica el progreso y aborta si se pidió cancelar"""
+    if cancel_event is not None and cancel_event.is_set():
+        raise TrainingCancelled()
+    if progress_callback is not None:
+        progress_callback(fraction, message)
+
+def _load_faces(jobs, progress_callback, cancel_event, prune=False):
+    """
+    Lee las muestras pendientes de cada usuario desde el caché de muestras
+
+    Args:
+        jobs: Lista de (usuario, etiqueta, [fotos])
+        prune: Depurar del caché las fotos que ya no se entrenan
+
+    Returns:
+        tuple: (rostros, etiquetas, {usuario: [fotos leídas]})
+    """
+    total = len(jobs) or 1
+    faces, face_labels, loaded = [], [], {}
+    for done, (user_name, label_id, photos) in enumerate(jobs):
+        _report(progress_callback, cancel_event, 0.8 * done / total, "Leyendo fotos...")
+        samples, added = load_user_samples(user_name, photos, prune=prune)
+        faces.extend(samples)
+        face_labels.extend([label_id] * len(added))
+        loaded[user_name] = added
+    return faces, face_labels, loaded
+
+def _id_map(labels):
+    """Convierte {nombre: id} al formato {id: nombre} del reconocedor"""
+    return {id_: name for name, id_ in labels.items()}
+
+def _train_incremental(bundle, manifest, progress_callback=None, cancel_event=None):
+    """
+    Agrega al modelo solo las muestras nuevas
+
+    Returns:
+        tuple o None: Igual que build_model; None si el cambio requiere
+                      reconstrucción completa
+    """
+    start_time = time.time()
+    labels = dict(manifest["labels"])
+    files = {name: list(photos) for name, photos in manifest["files"].items()}
+    users = {user_name for _, user_name, _, _ in list_users()}
+
+    # Usuarios eliminados no se pueden quitar de un modelo LBPH existente
+    if any(name not in users for name in labels):
+        Logger.info("Usuarios eliminados: se requiere reentrenamiento completo")
+        return None
+
+    jobs = []
+    next_label = max(labels.values(), default=-1) + 1
+
+    for user_name in sorted(users):
+        photos = _list_training_photos(user_name)
+        trained = files.get(user_name, [])
+        available = set(photos)
+        if any(photo not in available for photo in trained):
+            Logger.info(f"Fotos eliminadas de {user_name}: se requiere reentrenamiento completo")
+            return None
+
+        trained_set = set(trained)
+        pending = [p for p in photos if p not in trained_set][:MAX_IMAGES_PER_USER - len(trained)]
+        if not pending:
+            continue
+
+        if user_name not in labels:
+            labels[user_name] = next_label
+            next_label += 1
+        jobs.append((user_name, labels[user_name], pending))
+
+    faces, face_labels, loaded = _load_faces(jobs, progress_callback, cancel_event)
+    if not faces:
+        Logger.info("Modelo al día, no hay fotos nuevas")
+        return None, _id_map(manifest["labels"]), bundle.generation
+
+    for user_name, added in loaded.items():
+        files[user_name] = files.get(user_name, []) + added
+
+    _report(progress_callback, cancel_event, 0.8, "Actualizando modelo...")
+    recognizer = create_recognizer()
+    recognizer.read(bundle.model_path)
+    Logger.info(f"Actualizando modelo con {len(faces)} imágenes nuevas...")
+    recognizer.update(faces, np.array(face_labels))
+
+    # Usuarios sin muestras válidas no deben quedar en el mapa
+    labels = {name: id_ for name, id_ in labels.items() if files.get(name)}
+    _report(progress_callback, cancel_event, 0.95, "Guardando modelo...")
+    generation = _save_model(recognizer, labels, files, sum(len(p) for p in files.values()))
+
+    Logger.info(f"Entrenamiento incremental completado en {time.time()-start_time:.2f}s")
+    return recognizer, _id_map(labels), generation
+
+def _train_full(bundle, progress_callback=None, cancel_event=None):
+    """Entrenamiento completo conservando los IDs de etiqueta existentes"""
+    start_time = time.time()
+    Logger.info("Iniciando entrenamiento...")
+
+    previous = read_manifest(bundle)
+    previous_labels = previous["labels"] if previous else {}
+    next_label = max(previous_labels.values(), default=-1) + 1
+
+    # Colectar datos
+    jobs = []
+    for user_id, user_name, _, _ in list_users():
+        photos = _list_training_photos(user_name)[:MAX_IMAGES_PER_USER]
+        if not photos:
+            continue
+
+        if user_name in previous_labels:
+            label_id = previous_labels[user_name]
+        else:
+            label_id = next_label
+            next_label += 1
+        jobs.append((user_name, label_id, photos))
+
+    faces, face_labels, loaded = _load_faces(jobs, progress_callback, cancel_event, prune=True)
+    purge_cache(user_name for user_name, _, _ in jobs)
+    labels = {user_name: label_id for user_name, label_id, _ in jobs if loaded[user_name]}
+    files = {user_name: added for user_name, added in loaded.items() if added}
+
+    if len(faces) < 2:
+        Logger.error("Insuficientes imágenes para entrenar")
+        return None
+
+    # Entrenamiento con progreso
+    _report(progress_callback, cancel_event, 0.8, "Entrenando modelo...")
+    recognizer = create_recognizer()
+    Logger.info(f"Entrenando con {len(faces)} imágenes...")
+    recognizer.train(faces, np.array(face_labels))
+    _report(progress_callback, cancel_event, 0.95, "Guardando modelo...")
+    generation = _save_model(recognizer, labels, files, len(faces))
+
+    Logger.info(f"Entrenamiento completado en {time.time()-start_time:.2f}s")
+    return recognizer, _id_map(labels), generation
+
+def _train_shards(bundle, full_rebuild=False, progress_callback=None, cancel_event=None,
+                  loaded=None):
+    """
+    Reconstruye solo los shards cuyo conjunto de fotos cambió
+
+    Los shards sin cambios se enlazan desde la generación actual y, si la
+    galería de esa generación ya está en memoria (loaded), se le agregan o
+    quitan en caliente solo los shards afectados: el costo es proporcional a
+    las fotos de los usuarios afectados.
+    """
+    start_time = time.time()
+    manifest = read_manifest(bundle) or {"labels": {}, "files": {}}
+    labels = dict(manifest["labels"])
+    files = {name: list(photos) for name, photos in manifest["files"].items()}
+    versions = {name: list(entries) for name, entries in manifest.get("versions", {}).items()}
+    users = [user_name for _, user_name, _, _ in list_users()]
+    user_set = set(users)
+
+    existing = set()
+    if bundle is not None and os.path.isdir(bundle.model_path):
+        existing = {f[:-len(".lbph")] for f in os.listdir(bundle.model_path) if f.endswith(".lbph")}
+
+    # Usuarios eliminados: no pasan a la nueva generación y se borra su caché
+    removed = [name for name in (set(labels) | existing) if name not in user_set]
+    for user_name in removed:
+        labels.pop(user_name, None)
+        files.pop(user_name, None)
+        versions.pop(user_name, None)
+    if removed:
+        purge_cache(users)
+
+    next_label = max(labels.values(), default=-1) + 1
+    jobs = []
+    for user_name in users:
+        photos = _list_training_photos(user_name)[:MAX_IMAGES_PER_USER]
+        if not photos and user_name not in existing and user_name not in files:
+            continue
+        current = _photo_versions(user_name, photos)
+        # Al día: mismas fotos y versiones, con su shard (o sin fotos legibles)
+        if (not full_rebuild and versions.get(user_name) == current
+                and (user_name in existing or user_name not in files)):
+            continue
+        versions[user_name] = current
+        if user_name not in labels:
+            labels[user_name] = next_label
+            next_label += 1
+        jobs.append((user_name, labels[user_name], photos))
+
+    if not jobs and not removed:
+        Logger.info("Modelo al día, no hay fotos nuevas")
+        return None, _id_map(labels), bundle.generation if bundle else 0
+
+    new_bundle = create_bundle()
+    try:
+        os.makedirs(new_bundle.model_path)
+        rebuilt = {user_name for user_name, _, _ in jobs}
+        for user_name in existing & user_set - rebuilt:
+            link_file(shard_path(bundle.model_path, user_name),
+                      shard_path(new_bundle.model_path, user_name))
+
+        engine = NumpyLBPHRecognizer()
+        total = len(jobs) or 1
+        for done, (user_name, label_id, photos) in enumerate(jobs):
+            _report(progress_callback, cancel_event, 0.95 * done / total,
+                    f"Entrenando {user_name}...")
+            samples, added = load_user_samples(user_name, photos, prune=True)
+            if added:
+                write_shard(new_bundle.model_path, user_name,
+                            engine.compute_histograms(samples), label_id)
+                files[user_name] = added
+            else:
+                files.pop(user_name, None)
+
+        labels = {name: id_ for name, id_ in labels.items() if files.get(name)}
+        if not labels:
+            Logger.error("Insuficientes imágenes para entrenar")
+            discard_bundle(new_bundle)
+            return None
+
+        # La galería consolidada se enlaza sin copiarla; las filas de los usuarios
+        # reconstruidos o eliminados dejan de valer en el índice de la nueva generación
+        base_rows = read_gallery_index(bundle.model_path) if bundle is not None and existing else None
+        if base_rows is not None:
+            link_file(os.path.join(bundle.model_path, GALLERY_NAME),
+                      os.path.join(new_bundle.model_path, GALLERY_NAME))
+            write_gallery_index(new_bundle.model_path, {
+                name: rows for name, rows in base_rows.items() if name in user_set and name not in rebuilt})
+
+        base_recognizer, base_generation = loaded or (None, None)
+        if (not full_rebuild and bundle is not None and base_generation == bundle.generation
+                and isinstance(base_recognizer, ShardedLBPHRecognizer)):
+            recognizer = base_recognizer
+            for user_name in removed:
+                recognizer = recognizer.without_shard(user_name)
+            for user_name in rebuilt:
+                if files.get(user_name):
+                    recognizer = recognizer.with_shard(
+                        user_name, shard_path(new_bundle.model_path, user_name))
+                else:
+                    recognizer = recognizer.without_shard(user_name)
+        else:
+            recognizer = ShardedLBPHRecognizer()
+            recognizer.read(new_bundle.model_path)
+        if recognizer.needs_consolidation():
+            _report(progress_callback, cancel_event, 0.9, "Consolidando galería...")
+            write_gallery(new_bundle.model_path, recognizer)
+            recognizer = ShardedLBPHRecognizer()
+            recognizer.read(new_bundle.model_path)
+        _report(progress_callback, cancel_event, 0.95, "Guardando modelo...")
+        generation = publish_bundle(new_bundle, labels, files, recognizer.sample_count, versions)
+    except Exception:
+        # Cancelado o fallido: la generación a medio armar nunca se publica
+        discard_bundle(new_bundle)
+        raise
+
+    Logger.info(f"{len(jobs)} shards actualizados y {len(removed)} eliminados "
+                f"en {time.time()-start_time:.2f}s")
+    return recognizer, _id_map(labels), generation
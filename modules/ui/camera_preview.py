@@ -3,12 +3,14 @@ from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.image import Image
 from kivy.uix.button import Button
 from kivy.clock import Clock
-from modules.camera.camera_utils import camera_manager  # Importación actualizada
+from modules.camera.camera_utils import camera_manager, FrameDisplay  # Importación actualizada
 
 class CameraPreviewScreen(Screen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.img = Image()
+        self.display = FrameDisplay(mirror=True)
+        self._last_seq = None
         self.back_btn = Button(text="Volver", size_hint=(1, .1))
         self.back_btn.bind(on_press=self.go_back)
 
@@ -31,9 +33,10 @@ class CameraPreviewScreen(Screen):
         camera_manager.release_camera()
 
     def update(self, dt):
-        frame = camera_manager.read_frame()
-        if frame is not None:
-            self.img.texture = camera_manager.frame_to_texture(frame)
+        latest = camera_manager.read_latest(after_seq=self._last_seq)
+        if latest is not None:
+            frame, self._last_seq, _ = latest
+            self.display.show(self.img, frame)
 
     def go_back(self, instance):
         self.manager.current = 'main_menu'
\ No newline at end of file
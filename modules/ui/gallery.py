@@ -2,13 +2,13 @@ from kivy.uix.screenmanager import Screen
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.gridlayout import GridLayout
 from kivy.uix.button import Button
-from kivy.uix.image import Image
 from kivy.uix.scrollview import ScrollView
 from kivy.uix.label import Label
 from kivy.uix.popup import Popup
 from kivy.uix.textinput import TextInput
 from modules.database.operations import list_users
 from modules.utils.file_io import list_user_photos
+from modules.ui.photo_image import photo_image
 import os
 from kivy.logger import Logger
 
@@ -73,7 +73,7 @@ class GalleryScreen(Screen):
             photos = list_user_photos(user_name=name)
             for p in photos[:4]:  # Mostrar máximo 4 fotos por usuario
                 try:
-                    img = Image(source=p, size_hint_y=None, height=150)
+                    img = photo_image(p, size_hint_y=None, height=150)
                     img.bind(on_touch_down=lambda instance, touch, path=p: self.show_full_image(path) 
                              if instance.collide_point(*touch.pos) else None)
                     self.grid.add_widget(img)
@@ -87,7 +87,7 @@ class GalleryScreen(Screen):
     def show_full_image(self, image_path):
         content = BoxLayout(orientation='vertical')
         try:
-            img = Image(source=image_path)
+            img = photo_image(image_path)
             btn_close = Button(text="Cerrar", size_hint=(1, .1))
             
             popup = Popup(title=os.path.basename(image_path), size_hint=(.8, .8))
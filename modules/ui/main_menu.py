@@ -6,7 +6,7 @@ from kivy.uix.label import Label
 from kivy.clock import Clock
 from kivy.graphics import Color, Rectangle
 from kivy.core.window import Window
-from modules.camera.camera_utils import camera_manager
+from modules.camera.camera_utils import camera_manager, FrameDisplay
 from modules.face_recognition.recognition import FaceRecognizer
 from kivy.logger import Logger
 import threading
@@ -15,6 +15,8 @@ class MainMenuScreen(Screen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.camera_preview = None
+        self.display = FrameDisplay(mirror=True)
+        self._last_seq = None
         self._camera_clock = None
         self._model_check_clock = None
         self.buttons_created = False
@@ -103,9 +105,10 @@ class MainMenuScreen(Screen):
     def _update_camera(self, dt):
         """Actualiza la vista previa de la cámara"""
         if self.camera_preview and self.camera_preview.parent:
-            frame = camera_manager.read_frame()
-            if frame is not None:
-                self.camera_preview.texture = camera_manager.frame_to_texture(frame)
+            latest = camera_manager.read_latest(after_seq=self._last_seq)
+            if latest is not None:
+                frame, self._last_seq, _ = latest
+                self.display.show(self.camera_preview, frame)
 
     def _check_model_status(self, dt):
         """Verifica el estado del modelo de reconocimiento"""
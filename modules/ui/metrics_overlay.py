@@ -0,0 +1,47 @@
+from kivy.uix.floatlayout import FloatLayout
+from kivy.uix.label import Label
+from kivy.clock import Clock
+from modules.utils.metrics import metrics, METRICS_OVERLAY
+
+# Segundos entre actualizaciones del texto del overlay
+OVERLAY_REFRESH = 1.0
+
+class MetricsOverlay(Label):
+    """Percentiles por etapa, FPS y frames perdidos dibujados sobre la vista de cámara"""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("font_size", "11sp")
+        kwargs.setdefault("color", (1, 1, 0.3, 1))
+        super().__init__(halign="left", valign="top", **kwargs)
+        self.bind(size=lambda widget, size: setattr(widget, "text_size", size))
+        self._clock = None
+
+    def start(self):
+        if self._clock is None:
+            self._clock = Clock.schedule_interval(self.refresh, OVERLAY_REFRESH)
+
+    def stop(self):
+        if self._clock is not None:
+            Clock.unschedule(self._clock)
+            self._clock = None
+        self.text = ""
+
+    def refresh(self, dt=None):
+        self.text = metrics.format_summary()
+
+def with_metrics_overlay(view):
+    """
+    Envuelve la vista de cámara con un MetricsOverlay si METRICS_OVERLAY está activo
+
+    Returns:
+        tuple: (widget a agregar al layout, MetricsOverlay o None)
+    """
+    if not METRICS_OVERLAY:
+        return view, None
+    container = FloatLayout(size_hint=view.size_hint)
+    view.size_hint = (1, 1)
+    view.pos_hint = {"x": 0, "y": 0}
+    overlay = MetricsOverlay(size_hint=(1, 1), pos_hint={"x": 0, "y": 0})
+    container.add_widget(view)
+    container.add_widget(overlay)
+    return container, overlay
@@ -0,0 +1,11 @@
+from io import BytesIO
+from kivy.core.image import Image as CoreImage
+from kivy.uix.image import Image
+from modules.utils.photo_store import is_packed, read_photo_bytes
+
+def photo_image(path, **kwargs):
+    """Widget Image para una foto del catálogo, suelta o guardada en un pack"""
+    if not is_packed(path):
+        return Image(source=path, **kwargs)
+    texture = CoreImage(BytesIO(read_photo_bytes(path)), ext="jpg").texture
+    return Image(texture=texture, **kwargs)
@@ -8,11 +8,22 @@ from kivy.uix.gridlayout import GridLayout
 from kivy.clock import Clock
 from kivy.properties import ObjectProperty
 from kivy.logger import Logger
-from modules.camera.camera_utils import camera_manager
+from modules.camera.camera_utils import camera_manager, FrameDisplay, DEFAULT_CAMERA
+from modules.database.events import log_recognized
 from modules.face_recognition.detection import FaceDetector
 from modules.face_recognition.recognition import FaceRecognizer
+from modules.face_recognition.tracking import FaceTracker
+from modules.face_recognition.pipeline import VisionPipeline
 from modules.utils.file_io import list_user_photos
+from modules.ui.photo_image import photo_image
+from modules.utils.helpers import largest_faces
+from modules.utils.metrics import metrics
+from modules.ui.metrics_overlay import with_metrics_overlay
 import cv2
+import time
+
+# Límite de rostros reconocidos por frame para acotar la latencia en escenas concurridas
+MAX_FACES_PER_FRAME = 5
 
 class RecognizeScreen(Screen):
     img = ObjectProperty(None)
@@ -24,6 +35,12 @@ class RecognizeScreen(Screen):
         self.detector = FaceDetector()
         self.recognizer = FaceRecognizer()
         self.current_user = None
+        self.max_faces = MAX_FACES_PER_FRAME
+        self.tracker = FaceTracker()
+        self.pipeline = VisionPipeline(self._process_frame, name="reconocimiento")
+        self._last_seq = None
+        # Textura reutilizada; se muestra sin espejo como antes
+        self.display = FrameDisplay(mirror=False)
         self._camera_clock = None
         
         # Configuración de la interfaz
@@ -31,7 +48,8 @@ class RecognizeScreen(Screen):
         
         # Vista de la cámara
         self.img = Image(size_hint=(1, 0.6))
-        layout.add_widget(self.img)
+        view, self.metrics_overlay = with_metrics_overlay(self.img)
+        layout.add_widget(view)
         
         # Etiqueta de información
         self.info = Label(
@@ -77,7 +95,11 @@ class RecognizeScreen(Screen):
             self.recognizer = FaceRecognizer()
             
             if camera_manager.open_camera():
-                self._camera_clock = Clock.schedule_interval(self.update, 1.0/15.0)
+                # La visión corre en el pipeline; la UI solo muestra resultados
+                self.pipeline.start()
+                self._camera_clock = Clock.schedule_interval(self.update, 1.0/30.0)
+                if self.metrics_overlay:
+                    self.metrics_overlay.start()
         except Exception as e:
             Logger.error(f"Error al iniciar reconocimiento: {str(e)}")
             self.info.text = f"Error: {str(e)}"
@@ -87,44 +109,88 @@ class RecognizeScreen(Screen):
         Logger.info("PantallaReconocimiento: Ocultando pantalla de reconocimiento")
         if self._camera_clock:
             Clock.unschedule(self._camera_clock)
+        if self.metrics_overlay:
+            self.metrics_overlay.stop()
+        self.pipeline.stop()
+        self._last_seq = None
         camera_manager.release_camera()
+        self.tracker.reset()
+        self.detector.reset()
         self.clear_gallery()
+        
+        if self.recognizer.cache is not None:
+            stats = self.recognizer.cache.stats()
+            Logger.info(f"PantallaReconocimiento: caché de resultados {stats['hits']} aciertos, "
+                        f"{stats['misses']} fallos ({100 * stats['hit_rate']:.0f}%)")
 
-    def update(self, dt):
-        """Actualización con manejo de errores mejorado"""
-        try:
-            frame = camera_manager.read_frame()
-            if frame is None:
-                return
-            
-            # AGREGAR ESTA LÍNEA PARA CORREGIR EL EFECTO ESPEJO
-            frame = cv2.flip(frame, 1)  # Volteo horizontal
-            
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            faces = self.detector.detect(gray)
-            
-            if faces is not None and len(faces) > 0:
-                (x, y, w, h) = faces[0]
-                roi = gray[y:y+h, x:x+w]
+    def _process_frame(self, frame, gray):
+        """Detección, seguimiento y reconocimiento; corre en el hilo del pipeline"""
+        # Detección reducida y limitada a la zona de los últimos rostros
+        with metrics.stage("deteccion"):
+            faces = self.detector.detect_fast(gray)
+        
+        # Los rostros más grandes (más cercanos) primero
+        faces = largest_faces(faces, self.max_faces)
+        
+        tracks = self.tracker.update(faces)
+        known = []
+        
+        if tracks:
+            # Solo se reconocen rostros nuevos, con confianza baja o que tocan refresco
+            pending = [t for t in tracks if t.needs_recognition()]
+            if pending:
+                rois = [gray[y:y+h, x:x+w] for (x, y, w, h) in (t.box for t in pending)]
                 
-                # Usar el reconocedor actualizado
-                name, conf = self.recognizer.predict(roi)
+                # Un solo lote para todos los rostros pendientes del frame
+                with metrics.stage("prediccion"):
+                    results = self.recognizer.predict_batch(rois)
+                for track, (name, conf) in zip(pending, results):
+                    track.add_prediction(name, conf)
                 
-                # Dibujar resultados
+                # Asistencia: solo encola en memoria, la escritura es en segundo plano
+                log_recognized(self.tracker.confirmed(tracks), DEFAULT_CAMERA)
+            
+            # El frame del buffer es de solo lectura: copia única para dibujar
+            frame = frame.copy()
+            
+            # Dibujar resultados con la etiqueta votada de cada track
+            for track in tracks:
+                (x, y, w, h) = track.box
+                name, conf = track.name, track.confidence
                 cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
                 text = f"{name} ({conf:.1f}%)" if conf else name
                 cv2.putText(frame, text, (x, y-10), 
                         cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+            
+            known = [t.name for t in tracks if t.votes and t.name != "Desconocido"]
+        
+        return frame, {"faces": len(tracks), "known": known}
+
+    def update(self, dt):
+        """Muestra el último resultado del pipeline; no hace trabajo de visión"""
+        try:
+            result = self.pipeline.latest(after_seq=self._last_seq)
+            if result is None:
+                return
+            self._last_seq = result.seq
+            
+            faces, known = result.info["faces"], result.info["known"]
+            if faces:
+                names = ", ".join(known) if known else "Desconocido"
+                self.info.text = f"Rostros: {faces} | {names} | {self.pipeline.fps:.0f} fps"
                 
-                if name != "Desconocido" and name != self.current_user:
-                    self.current_user = name
-                    self.update_gallery(name)
+                # La galería sigue al rostro reconocido más cercano
+                if known and known[0] != self.current_user:
+                    self.current_user = known[0]
+                    self.update_gallery(known[0])
             else:
                 if self.current_user is not None:
                     self.clear_gallery()
                     self.current_user = None
             
-            self.img.texture = camera_manager.frame_to_texture(frame)
+            self.display.show(self.img, result.frame)
+            metrics.tick("pantalla")
+            metrics.record("latencia_total", 1000.0 * (time.monotonic() - result.timestamp))
         except Exception as e:
             Logger.error(f"Error en update: {str(e)}")
 
@@ -139,8 +205,8 @@ class RecognizeScreen(Screen):
             
         self.gallery_label.text = f"Galería de {user_name}:"
         for photo_path in photos[:9]:  # Mostrar máximo 9 fotos
-            img = Image(
-                source=photo_path, 
+            img = photo_image(
+                photo_path, 
                 size_hint_y=None, 
                 height=100
             )
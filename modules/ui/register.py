@@ -7,13 +7,16 @@ from kivy.uix.label import Label
 from kivy.clock import Clock
 from kivy.properties import ObjectProperty
 from kivy.logger import Logger
-from modules.camera.camera_utils import camera_manager
+from modules.camera.camera_utils import camera_manager, FrameDisplay
 from modules.face_recognition.detection import FaceDetector
-from modules.utils.file_io import ensure_user_folder
-from modules.database.operations import add_user, increment_photo_count, user_exists
-from modules.face_recognition.training import train_model
+from modules.face_recognition.pipeline import VisionPipeline
+from modules.utils.helpers import largest_faces
+from modules.utils.metrics import metrics
+from modules.ui.metrics_overlay import with_metrics_overlay
+from modules.database.operations import RegistrationSession
+from modules.face_recognition.scheduler import training_scheduler
 import cv2
-import os
+import time
 
 class RegisterScreen(Screen):
     camera_preview = ObjectProperty(None)
@@ -28,13 +31,21 @@ class RegisterScreen(Screen):
         self.is_capturing = False
         self._camera_clock = None
         self._capture_clock = None
+        # Sesión de la captura automática en curso (se confirma al terminar)
+        self.session = None
+        self.pipeline = VisionPipeline(self._process_frame, name="registro")
+        self._last_preview_seq = None
+        self._last_capture_seq = None
+        # Vista previa tipo espejo mediante coordenadas de textura
+        self.display = FrameDisplay(mirror=True)
         
         # Layout principal
         layout = BoxLayout(orientation='vertical', spacing=10, padding=10)
         
         # Vista previa de la cámara
         self.camera_preview = Image(size_hint=(1, 0.7))
-        layout.add_widget(self.camera_preview)
+        view, self.metrics_overlay = with_metrics_overlay(self.camera_preview)
+        layout.add_widget(view)
         
         # Entrada de nombre
         self.name_input = TextInput(
@@ -81,8 +92,18 @@ class RegisterScreen(Screen):
         )
         self.back_btn.bind(on_press=self.go_back)
         
+        # Solo se habilita mientras hay un entrenamiento pendiente o en curso
+        self.cancel_training_btn = Button(
+            text="Cancelar Entrenamiento",
+            background_normal='',
+            background_color=(0.9, 0.6, 0.1, 1),
+            disabled=True
+        )
+        self.cancel_training_btn.bind(on_press=self.cancel_training)
+        
         btn_layout.add_widget(self.auto_capture_btn)
         btn_layout.add_widget(self.manual_capture_btn)
+        btn_layout.add_widget(self.cancel_training_btn)
         btn_layout.add_widget(self.back_btn)
         
         layout.add_widget(btn_layout)
@@ -93,43 +114,59 @@ class RegisterScreen(Screen):
         try:
             # Usar el manager en lugar de abrir directamente
             if camera_manager.open_camera():
+                # Detección en el pipeline; la UI solo muestra y guarda resultados
+                self.pipeline.start()
                 self._camera_clock = Clock.schedule_interval(self.update_camera, 1.0/30.0)
+                if self.metrics_overlay:
+                    self.metrics_overlay.start()
         except Exception as e:
             self.status_label.text = f"[b]Error:[/b] {str(e)}"
             self.status_label.color = (0.8, 0.2, 0.2, 1)
 
+    def on_leave(self):
+        """Al salir de la pantalla"""
+        if hasattr(self, '_camera_clock') and self._camera_clock:
+            Clock.unschedule(self._camera_clock)
+            self._camera_clock = None
+        self._abort_capture()
+        if self.metrics_overlay:
+            self.metrics_overlay.stop()
+        self.pipeline.stop()
+        self._last_preview_seq = None
+        self._last_capture_seq = None
+        camera_manager.release_camera()
 
-        def on_leave(self):
-            """Al salir de la pantalla"""
-            if hasattr(self, '_camera_clock') and self._camera_clock:
-                Clock.unschedule(self._camera_clock)
-            
+    def _process_frame(self, frame, gray):
+        """Detección y recorte del rostro; corre en el hilo del pipeline"""
+        with metrics.stage("deteccion"):
+            faces = largest_faces(self.detector.detect_fast(gray))
+        roi = None
+        
+        # Dibujar rectángulo alrededor de cada rostro; se captura el más grande (verde)
+        if faces:
+            # El frame del buffer es de solo lectura: copiar solo si hay que dibujar
+            frame = frame.copy()
+            for (x, y, w, h) in faces[1:]:
+                cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 165, 255), 1)
+            (x, y, w, h) = faces[0]
+            # Recortar y redimensionar el rostro más cercano
+            roi = cv2.resize(gray[y:y+h, x:x+w], (200, 200))
+            cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
+        
+        return frame, {"roi": roi}
 
     def update_camera(self, dt):
         """Actualiza la vista previa de la cámara"""
         try:
-            frame = camera_manager.read_frame()
-            if frame is None:
+            result = self.pipeline.latest(after_seq=self._last_preview_seq)
+            if result is None:
                 return
-                
-            # Detección de rostros
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            faces = self.detector.detect(gray)
-            
-            # Dibujar rectángulo alrededor del rostro
-            if faces is not None and len(faces) > 0:
-                (x, y, w, h) = faces[0]
-                cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
-                
-                # Mostrar contador durante captura automática
-                if self.is_capturing:
-                    cv2.putText(frame, f"Capturas: {self.capture_counter}/{self.max_captures}", 
-                               (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
+            self._last_preview_seq = result.seq
             
             # Actualizar vista previa
-            texture = camera_manager.frame_to_texture(frame)
-            if texture:
-                self.camera_preview.texture = texture
+            self.display.show(self.camera_preview, result.frame)
+            metrics.tick("pantalla")
+            metrics.record("latencia_total", 1000.0 * (time.monotonic() - result.timestamp))
         except Exception as e:
             Logger.error(f"PantallaRegistro: Error en update_camera: {str(e)}")
 
@@ -145,23 +182,12 @@ class RegisterScreen(Screen):
         if not self.validate_username(user_name):
             return
             
-        try:
-            # Verificar si el usuario existe
-            user_exists = os.path.exists(os.path.join("data", user_name))
-            
-            if not user_exists:
-                # Registrar usuario en la base de datos solo si es nuevo
-                if not add_user(user_name):
-                    self.status_label.text = "[b]Error:[/b] No se pudo registrar usuario"
-                    self.status_label.color = (0.8, 0.2, 0.2, 1)
-                    return
-            
-            user_folder = ensure_user_folder(user_name=user_name)
+        if self.is_capturing:
+            return
             
-            # Contar fotos existentes para no sobrescribir
-            existing_photos = len([f for f in os.listdir(user_folder) 
-                                if f.lower().endswith(('.jpg', '.jpeg', '.png'))])
-            start_count = existing_photos + 1
+        try:
+            # Usuario, fotos y contador se confirman juntos al terminar la captura
+            self.session = RegistrationSession(user_name)
             
             self.status_label.text = f"[b]Estado:[/b] Capturando {self.max_captures} fotos para {user_name}..."
             self.status_label.color = (0.2, 0.6, 0.2, 1)
@@ -169,7 +195,7 @@ class RegisterScreen(Screen):
             self.is_capturing = True
             self.capture_counter = 0
             self._capture_clock = Clock.schedule_interval(
-                lambda dt: self.capture_face(user_folder, user_name, start_count), 
+                lambda dt: self.capture_face(user_name), 
                 0.05  # Captura cada 0.5 segundos
             )
         except Exception as e:
@@ -190,8 +216,8 @@ class RegisterScreen(Screen):
             return False
             
         return True
-    def capture_face(self, user_folder, user_name, start_count):
-        """Captura un rostro y guarda la imagen con numeración correcta"""
+    def capture_face(self, user_name):
+        """Captura un rostro y lo agrega a la sesión de registro"""
         if not self.is_capturing or self.capture_counter >= self.max_captures:
             if self._capture_clock:
                 Clock.unschedule(self._capture_clock)
@@ -199,29 +225,21 @@ class RegisterScreen(Screen):
             self.finish_registration(user_name)
             return
             
-        frame = camera_manager.read_frame()
-        if frame is None:
+        # Solo frames nuevos del pipeline, para no guardar dos veces el mismo
+        result = self.pipeline.latest(after_seq=self._last_capture_seq)
+        if result is None:
             return
-            
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = self.detector.detect(gray)
+        self._last_capture_seq = result.seq
+        roi = result.info["roi"]
         
-        if faces is not None and len(faces) > 0:
+        if roi is not None:
             try:
-                # Recortar y redimensionar el rostro
-                roi = cv2.resize(gray[faces[0][1]:faces[0][1]+faces[0][3], 
-                                faces[0][0]:faces[0][0]+faces[0][2]], 
-                                (200, 200))
-                
-                # Guardar con numeración continua
-                img_path = os.path.join(user_folder, f"{start_count + self.capture_counter}.jpg")
-                cv2.imwrite(img_path, roi)
-                
-                # Actualizar contador solo si es nuevo usuario
-                if start_count == 1:  # Es un nuevo registro
-                    increment_photo_count(user_name)
-                
+                # Guardar con numeración continua; la base de datos se actualiza al confirmar
+                self.session.add_photo(roi)
                 self.capture_counter += 1
+                
+                # Contador en la etiqueta: en la vista espejo el texto dibujado saldría invertido
+                self.status_label.text = f"[b]Estado:[/b] Capturas: {self.capture_counter}/{self.max_captures}"
             except Exception as e:
                 Logger.error(f"Error al guardar imagen: {e}")
 
@@ -237,48 +255,33 @@ class RegisterScreen(Screen):
         if not self.validate_username(user_name):
             return
             
-        # Registrar usuario en la base de datos si no existe
-        if not user_exists(user_name) and not add_user(user_name):
-            self.status_label.text = "[b]Error:[/b] No se pudo registrar usuario"
-            self.status_label.color = (0.8, 0.2, 0.2, 1)
-            return
-            
-        frame = camera_manager.read_frame()
-        if frame is None:
+        result = self.pipeline.latest()
+        if result is None:
             self.status_label.text = "[b]Error:[/b] No se pudo capturar imagen"
             self.status_label.color = (0.8, 0.2, 0.2, 1)
             return
             
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = self.detector.detect(gray)
+        roi = result.info["roi"]
         
-        if faces is None or len(faces) == 0:
+        if roi is None:
             self.status_label.text = "[b]Error:[/b] No se detectó rostro"
             self.status_label.color = (0.8, 0.2, 0.2, 1)
             return
             
         try:
-            user_folder = ensure_user_folder(user_name=user_name)
-            existing_photos = len([f for f in os.listdir(user_folder) 
-                                 if f.lower().endswith(('.jpg', '.jpeg', '.png'))])
-            roi = cv2.resize(gray[faces[0][1]:faces[0][1]+faces[0][3], 
-                            faces[0][0]:faces[0][0]+faces[0][2]], 
-                            (200, 200))
-            img_path = os.path.join(user_folder, f"{existing_photos+1}.jpg")
-            cv2.imwrite(img_path, roi)
-            increment_photo_count(user_name)
-            
-            # Entrenar modelo y recargar
-            if train_model():
-                from modules.face_recognition.recognition import FaceRecognizer
-                recognizer = FaceRecognizer()
-                recognizer.reload_model()
-                
-                self.status_label.text = f"[b]Éxito:[/b] Foto de {user_name} guardada"
-                self.status_label.color = (0.2, 0.7, 0.2, 1)
-            else:
-                self.status_label.text = "[b]Error:[/b] Foto guardada pero falló el entrenamiento"
+            # Sesión de una foto: usuario, foto y contador en una transacción
+            with RegistrationSession(user_name) as session:
+                session.add_photo(roi)
+            if not session.committed:
+                self.status_label.text = "[b]Error:[/b] No se pudo registrar usuario"
                 self.status_label.color = (0.8, 0.2, 0.2, 1)
+                return
+            
+            self.status_label.text = f"[b]Éxito:[/b] Foto de {user_name} guardada"
+            self.status_label.color = (0.2, 0.7, 0.2, 1)
+
+            # Entrenar en segundo plano; capturas seguidas se agrupan en un solo entrenamiento
+            self._request_training(user_name)
         except Exception as e:
             Logger.error(f"PantallaRegistro: Error en manual_capture: {str(e)}")
             self.status_label.text = f"[b]Error:[/b] {str(e)}"
@@ -287,38 +290,62 @@ class RegisterScreen(Screen):
     def finish_registration(self, user_name):
         """Finalización optimizada del registro"""
         self.is_capturing = False
+        session, self.session = self.session, None
+        
+        if session is not None and len(session) == 0:
+            # Sin rostros capturados no se registra nada
+            session.rollback()
+        elif session is not None and not session.commit():
+            self.status_label.text = "[b]Error:[/b] No se pudo registrar usuario"
+            self.status_label.color = (0.8, 0.2, 0.2, 1)
+            return
         
         if self.capture_counter > 0:
             # Mostrar mensaje de progreso
             self.status_label.text = "[b]Estado:[/b] Entrenando modelo..."
             self.status_label.color = (0.3, 0.5, 0.8, 1)
-            
-            # Forzar actualización de la UI
-            from kivy.clock import Clock
-            Clock.schedule_once(lambda dt: self._async_finish_registration(user_name), 0.1)
+            self._request_training(user_name)
 
-    def _async_finish_registration(self, user_name):
-        """Finalización en segundo plano para no bloquear la UI"""
-        try:
-            # Entrenar modelo (puede tardar)
-            if train_model():
-                # Recargar modelo con throttling
-                from modules.face_recognition.recognition import FaceRecognizer
-                recognizer = FaceRecognizer()
-                
-                if recognizer.reload_model():
-                    self.status_label.text = f"[b]Éxito:[/b] {user_name} actualizado"
-                    self.status_label.color = (0.2, 0.7, 0.2, 1)
-                else:
-                    self.status_label.text = "[b]Advertencia:[/b] Modelo no recargado"
-                    self.status_label.color = (0.9, 0.6, 0.1, 1)
-            else:
-                self.status_label.text = "[b]Error:[/b] Falló el entrenamiento"
-                self.status_label.color = (0.8, 0.2, 0.2, 1)
-        except Exception as e:
-            Logger.error(f"Error en finalización: {str(e)}")
-            self.status_label.text = "[b]Error:[/b] Proceso falló"
+    def _abort_capture(self):
+        """Cancela una captura automática sin terminar y descarta sus fotos"""
+        if self._capture_clock:
+            Clock.unschedule(self._capture_clock)
+            self._capture_clock = None
+        self.is_capturing = False
+        if self.session is not None:
+            self.session.rollback()
+            self.session = None
+
+    def _request_training(self, user_name):
+        """Encola el entrenamiento en segundo plano para no bloquear la UI"""
+        self.cancel_training_btn.disabled = False
+        training_scheduler.request_training(
+            on_progress=self._on_training_progress,
+            on_done=lambda success, cancelled: self._on_training_done(user_name, success, cancelled)
+        )
+
+    def cancel_training(self, instance):
+        """Cancela el entrenamiento en curso; el modelo publicado no cambia"""
+        training_scheduler.cancel()
+
+    def _on_training_progress(self, fraction, message):
+        """Muestra el avance del entrenamiento"""
+        self.status_label.text = f"[b]Estado:[/b] {message} {fraction * 100:.0f}%"
+        self.status_label.color = (0.3, 0.5, 0.8, 1)
+
+    def _on_training_done(self, user_name, success, cancelled):
+        """El modelo ya fue publicado en FaceRecognizer por el planificador"""
+        self.cancel_training_btn.disabled = True
+        if success:
+            self.status_label.text = f"[b]Éxito:[/b] {user_name} actualizado"
+            self.status_label.color = (0.2, 0.7, 0.2, 1)
+        elif cancelled:
+            self.status_label.text = "[b]Advertencia:[/b] Entrenamiento cancelado"
+            self.status_label.color = (0.9, 0.6, 0.1, 1)
+        else:
+            self.status_label.text = "[b]Error:[/b] Falló el entrenamiento"
             self.status_label.color = (0.8, 0.2, 0.2, 1)
+
     def go_back(self, instance):
         """Regresa al menú principal"""
         self.manager.current = 'main_menu'
\ No newline at end of file
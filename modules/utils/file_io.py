@@ -1,7 +1,10 @@
 import os
-import shutil
+import zipfile
 from datetime import datetime
 
+# Ya comprimidos: se copian al ZIP tal cual (los packs en bloque, sin recomprimir)
+STORED_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.pack')
+
 def ensure_user_folder(base_dir="data", user_name=None):
     """
     Crea una carpeta para un usuario si no existe
@@ -41,27 +44,29 @@ def ensure_export_folder():
 
 def list_user_photos(user_name, base_dir="data"):
     """
-    Lista todas las fotos de un usuario
+    Lista todas las fotos de un usuario desde el catálogo de la base de datos
     
     Args:
         user_name: Nombre del usuario
         base_dir: Directorio base (default: "data")
     
     Returns:
-        list: Lista ordenada de rutas a fotos
+        list: Rutas a fotos en orden de captura
     """
-    user_dir = os.path.join(base_dir, user_name)
-    if not os.path.exists(user_dir):
-        return []
-    
-    photos = []
-    valid_ext = ('.png', '.jpg', '.jpeg')
-    
-    for f in sorted(os.listdir(user_dir)):
-        if f.lower().endswith(valid_ext):
-            photos.append(os.path.join(user_dir, f))
-    
-    return photos
+    # Importación local: operations usa ensure_user_folder de este módulo
+    from modules.database.operations import list_photos
+    return [os.path.join(base_dir, user_name, os.path.basename(row[0]))
+            for row in list_photos(user_name)]
+
+def _zip_folder(source_dir, export_path):
+    """Comprime source_dir; fotos y packs van sin recomprimir"""
+    with zipfile.ZipFile(export_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for root, _, files in os.walk(source_dir):
+            for file_name in sorted(files):
+                path = os.path.join(root, file_name)
+                stored = file_name.lower().endswith(STORED_EXTENSIONS)
+                archive.write(path, os.path.relpath(path, source_dir),
+                              zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED)
 
 def export_user_data(user_name=None):
     """
@@ -84,23 +89,21 @@ def export_user_data(user_name=None):
         
         zip_name = f"export_{user_name}_{timestamp}.zip"
         export_path = os.path.join(export_dir, zip_name)
-        shutil.make_archive(export_path[:-4], 'zip', source_dir)
+        _zip_folder(source_dir, export_path)
     else:
         # Exportar todos los usuarios
         zip_name = f"export_all_{timestamp}.zip"
         export_path = os.path.join(export_dir, zip_name)
-        shutil.make_archive(export_path[:-4], 'zip', "data")
+        _zip_folder("data", export_path)
     
     return export_path
 
 def count_user_photos(user_name, base_dir="data"):
-    """Cuenta las fotos de un usuario"""
-    return len(list_user_photos(user_name, base_dir))
+    """Cuenta las fotos catalogadas de un usuario"""
+    from modules.database.operations import count_photos
+    return count_photos(user_name)
 
 def get_all_users(base_dir="data"):
     """Obtiene lista de todos los usuarios registrados"""
-    if not os.path.exists(base_dir):
-        return []
-    
-    return [d for d in os.listdir(base_dir) 
-           if os.path.isdir(os.path.join(base_dir, d))]
\ No newline at end of file
+    from modules.database.operations import list_users
+    return [name for _, name, _, _ in list_users()]
\ No newline at end of file
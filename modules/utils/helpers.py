@@ -6,3 +6,12 @@ def crop_face_from_frame(frame, face_rect):
     gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
     roi = gray[y:y+h, x:x+w]
     return roi
+
+
+def largest_faces(faces, max_faces=None):
+    """Ordena los rostros (x,y,w,h) de mayor a menor área y limita la cantidad"""
+    if faces is None or len(faces) == 0:
+        return []
+    ordered = sorted((tuple(int(v) for v in f) for f in faces),
+                     key=lambda f: f[2] * f[3], reverse=True)
+    return ordered[:max_faces] if max_faces else ordered
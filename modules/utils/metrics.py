@@ -0,0 +1,179 @@
+import os
+import json
+import time
+from collections import deque
+from contextlib import nullcontext
+from datetime import datetime
+from threading import Lock
+import numpy as np
+from kivy.clock import Clock
+from kivy.logger import Logger
+
+# METRICS=1 mide cada etapa; METRICS_OVERLAY=1 además las muestra sobre la cámara y
+# METRICS_DUMP=metricas.json las escribe cada METRICS_DUMP_INTERVAL segundos
+METRICS_OVERLAY = os.environ.get("METRICS_OVERLAY", "0") not in ("", "0")
+METRICS_DUMP = os.environ.get("METRICS_DUMP")
+METRICS_ENABLED = (os.environ.get("METRICS", "0") not in ("", "0")
+                   or METRICS_OVERLAY or bool(METRICS_DUMP))
+METRICS_DUMP_INTERVAL = 10.0
+
+# Muestras recientes por etapa sobre las que se calculan los percentiles
+METRICS_WINDOW = 300
+# Ventana (segundos) para los contadores de FPS
+FPS_WINDOW = 2.0
+
+# Contexto compartido cuando las métricas están apagadas: sin reloj ni asignaciones
+_DISABLED_STAGE = nullcontext()
+
+class _Stage:
+    """Mide el bloque with y lo registra como una muestra de la etapa"""
+    __slots__ = ("_metrics", "_name", "_start")
+
+    def __init__(self, metrics, name):
+        self._metrics = metrics
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._metrics.record(self._name, 1000.0 * (time.perf_counter() - self._start))
+        return False
+
+class StageMetrics:
+    """
+    Latencia por etapa (captura, gris, detección, predicción, textura...) con
+    ventanas deslizantes de METRICS_WINDOW muestras, contadores de FPS y
+    valores instantáneos (frames perdidos)
+
+    Con las métricas apagadas stage() devuelve un contexto vacío compartido y
+    record()/tick() retornan de inmediato.
+    """
+    _instance = None
+    _lock = Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+                    cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        self.enabled = METRICS_ENABLED
+        self._data_lock = Lock()
+        self._samples = {}
+        self._ticks = {}
+        self._gauges = {}
+        self._dump_clock = None
+
+    def stage(self, name):
+        """Contexto que mide su bloque como una muestra de la etapa name"""
+        if not self.enabled:
+            return _DISABLED_STAGE
+        return _Stage(self, name)
+
+    def record(self, name, ms):
+        """Registra una duración en milisegundos"""
+        if not self.enabled:
+            return
+        with self._data_lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=METRICS_WINDOW)
+            samples.append(ms)
+
+    def tick(self, name):
+        """Cuenta un evento (frame capturado, procesado, mostrado) para su FPS"""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        with self._data_lock:
+            ticks = self._ticks.get(name)
+            if ticks is None:
+                ticks = self._ticks[name] = deque()
+            ticks.append(now)
+            while now - ticks[0] > FPS_WINDOW:
+                ticks.popleft()
+
+    def register_gauge(self, name, func):
+        """Valor leído al armar el resumen, p. ej. los frames perdidos de la cámara"""
+        self._gauges[name] = func
+
+    def reset(self):
+        with self._data_lock:
+            self._samples.clear()
+            self._ticks.clear()
+
+    def snapshot(self):
+        """
+        Resumen de las ventanas actuales
+
+        Returns:
+            dict: {"timestamp", "stages": {etapa: {"count", "mean_ms", "p50_ms",
+                   "p95_ms", "p99_ms"}}, "fps": {contador: fps}, "gauges": {nombre: valor}}
+        """
+        now = time.monotonic()
+        with self._data_lock:
+            samples = {name: np.fromiter(values, dtype=np.float64, count=len(values))
+                       for name, values in self._samples.items() if values}
+            ticks = {name: [t for t in values if now - t <= FPS_WINDOW]
+                     for name, values in self._ticks.items()}
+
+        stages = {}
+        for name, values in samples.items():
+            p50, p95, p99 = np.percentile(values, (50, 95, 99))
+            stages[name] = {"count": int(len(values)), "mean_ms": float(values.mean()),
+                            "p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99)}
+        fps = {}
+        for name, values in ticks.items():
+            elapsed = values[-1] - values[0] if len(values) > 1 else 0.0
+            fps[name] = (len(values) - 1) / elapsed if elapsed > 0 else 0.0
+        gauges = {}
+        for name, func in list(self._gauges.items()):
+            try:
+                gauges[name] = func()
+            except Exception as e:
+                Logger.warning(f"Métricas: no se pudo leer {name}: {str(e)}")
+        return {"timestamp": datetime.now().isoformat(timespec="seconds"),
+                "stages": stages, "fps": fps, "gauges": gauges}
+
+    def format_summary(self, snapshot=None):
+        """Texto compacto del resumen para el overlay de las pantallas"""
+        snapshot = snapshot or self.snapshot()
+        lines = [" | ".join(f"{name} {value:.1f} fps" for name, value in snapshot["fps"].items())]
+        for name, s in snapshot["stages"].items():
+            lines.append(f"{name:<18} p50 {s['p50_ms']:6.1f}  p95 {s['p95_ms']:6.1f}  "
+                         f"p99 {s['p99_ms']:6.1f} ms")
+        if snapshot["gauges"]:
+            lines.append(" | ".join(f"{name}: {value}" for name, value in snapshot["gauges"].items()))
+        return "\n".join(lines)
+
+    def dump(self, path=None):
+        """Escribe el resumen como JSON; se reemplaza de una vez para no dejar archivos a medias"""
+        path = path or METRICS_DUMP
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.snapshot(), f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            Logger.error(f"Métricas: error al escribir {path}: {str(e)}")
+
+    def start_dump(self, path=None, interval=METRICS_DUMP_INTERVAL):
+        """Programa dump() periódico en el reloj de Kivy (por defecto a METRICS_DUMP)"""
+        path = path or METRICS_DUMP
+        if not self.enabled or not path or self._dump_clock is not None:
+            return
+        self._dump_clock = Clock.schedule_interval(lambda dt: self.dump(path), interval)
+        Logger.info(f"Métricas: resumen cada {interval:.0f}s en {path}")
+
+    def stop_dump(self):
+        if self._dump_clock is not None:
+            Clock.unschedule(self._dump_clock)
+            self._dump_clock = None
+
+# Instancia global de métricas
+metrics = StageMetrics()
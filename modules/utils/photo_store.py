@@ -0,0 +1,140 @@
+import os
+import mmap
+import struct
+import threading
+import cv2
+import numpy as np
+
+# Almacenamiento de las capturas nuevas: "files" (un N.jpg por foto) o "pack"
+# (un archivo photos.pack por usuario al que solo se agregan registros)
+PHOTO_STORAGE = os.environ.get("PHOTO_STORAGE", "files")
+PACK_NAME = "photos.pack"
+
+# Registro del pack: cabecera (marca, longitud) seguida del JPEG
+RECORD_HEADER = struct.Struct("<4sI")
+RECORD_MAGIC = b"FACE"
+
+# Ruta de una foto empaquetada: data/<usuario>/photos.pack#<offset>-<longitud>;
+# el offset con ceros a la izquierda ordena las fotos por captura
+PACK_SEPARATOR = "#"
+
+_maps = {}
+_maps_lock = threading.Lock()
+
+def pack_path(user_folder):
+    return os.path.join(user_folder, PACK_NAME)
+
+def is_packed(path):
+    return PACK_SEPARATOR in os.path.basename(path)
+
+def packed_photo_path(pack_file, offset, length):
+    return f"{pack_file}{PACK_SEPARATOR}{offset:012d}-{length}"
+
+def parse_packed_path(path):
+    """
+    Returns:
+        tuple: (ruta del pack, offset del JPEG, longitud)
+    """
+    pack_file, _, location = path.rpartition(PACK_SEPARATOR)
+    offset, _, length = location.partition("-")
+    return pack_file, int(offset), int(length)
+
+def append_to_pack(pack_file, data):
+    """
+    Agrega un JPEG al final del pack
+
+    Returns:
+        str: Ruta empaquetada de la foto
+    """
+    with open(pack_file, "ab") as f:
+        offset = f.tell() + RECORD_HEADER.size
+        f.write(RECORD_HEADER.pack(RECORD_MAGIC, len(data)))
+        f.write(data)
+    return packed_photo_path(pack_file, offset, len(data))
+
+def truncate_pack(pack_file, size):
+    """Descarta los registros agregados después de size bytes (rollback de una sesión)"""
+    with _maps_lock:
+        mapped = _maps.pop(pack_file, None)
+    if mapped is not None:
+        mapped.close()
+    if size == 0:
+        os.remove(pack_file)
+        return
+    with open(pack_file, "r+b") as f:
+        f.truncate(size)
+
+def scan_pack(pack_file):
+    """
+    Recorre los registros de un pack en orden (para reconstruir el catálogo)
+
+    Un registro final incompleto (escritura interrumpida) se ignora.
+
+    Returns:
+        list: Rutas empaquetadas de las fotos
+    """
+    photos = []
+    with open(pack_file, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        position = 0
+        while position + RECORD_HEADER.size <= size:
+            magic, length = RECORD_HEADER.unpack(f.read(RECORD_HEADER.size))
+            offset = position + RECORD_HEADER.size
+            if magic != RECORD_MAGIC or offset + length > size:
+                break
+            photos.append(packed_photo_path(pack_file, offset, length))
+            f.seek(length, os.SEEK_CUR)
+            position = offset + length
+    return photos
+
+def _pack_map(pack_file, end):
+    """mmap de solo lectura del pack, reabierto si el pack creció después de mapearlo"""
+    with _maps_lock:
+        mapped = _maps.get(pack_file)
+        if mapped is None or len(mapped) < end:
+            if mapped is not None:
+                mapped.close()
+            with open(pack_file, "rb") as f:
+                mapped = _maps[pack_file] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return mapped
+
+def read_photo_bytes(path):
+    """JPEG de una foto suelta o empaquetada"""
+    if not is_packed(path):
+        with open(path, "rb") as f:
+            return f.read()
+    pack_file, offset, length = parse_packed_path(path)
+    return _pack_map(pack_file, offset + length)[offset:offset + length]
+
+def read_photo(path, flags=cv2.IMREAD_GRAYSCALE):
+    """Decodifica una foto suelta o empaquetada; None si no se puede leer"""
+    if not is_packed(path):
+        return cv2.imread(path, flags)
+    try:
+        data = read_photo_bytes(path)
+    except (OSError, ValueError):
+        return None
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+
+def photo_key(path):
+    """
+    Versión de una foto para los cachés: mtime y tamaño de un archivo suelto;
+    los registros de un pack no cambian, así que basta su ubicación
+
+    Raises:
+        OSError: Si la foto ya no existe
+    """
+    if not is_packed(path):
+        stat = os.stat(path)
+        return [stat.st_mtime_ns, stat.st_size]
+    pack_file, offset, length = parse_packed_path(path)
+    if os.path.getsize(pack_file) < offset + length:
+        raise FileNotFoundError(path)
+    return [offset, length]
+
+def close_packs():
+    """Cierra los mmaps abiertos (antes de mover o exportar los packs)"""
+    with _maps_lock:
+        for mapped in _maps.values():
+            mapped.close()
+        _maps.clear()